@@ -0,0 +1,108 @@
+"""Versioned schema migrations for backen.
+
+Each step is ``(version, description, fn)`` where ``fn(conn)`` receives a
+connection inside the step's transaction. Steps must be idempotent (use the
+``*_if_missing`` helpers) because the first step creates the current models
+with ``create_all``, so later steps may find their change already in place
+on a fresh database.
+"""
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
+
+logger = logging.getLogger("migrations")
+
+Migration = Tuple[int, str, Callable]
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def current_version(conn) -> int:
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def add_column_if_missing(conn, table: str, column: str, ddl: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index_if_missing(conn, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def run_migrations(engine, migrations: List[Migration]) -> int:
+    """Apply pending steps in version order, one transaction per step.
+
+    Safe to call from several workers at startup: a step whose version row
+    was recorded concurrently is skipped. Returns the resulting version.
+    """
+    _meta.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for step_version, description, fn in sorted(migrations, key=lambda m: m[0]):
+        if step_version <= version:
+            continue
+        try:
+            with engine.begin() as conn:
+                if current_version(conn) >= step_version:
+                    continue
+                fn(conn)
+                conn.execute(schema_version.insert().values(version=step_version, description=description))
+            logger.info("Applied migration %s: %s", step_version, description)
+        except IntegrityError:
+            logger.info("Migration %s already applied by another worker", step_version)
+        version = step_version
+    return version
+
+
+def _initial_schema(conn):
+    from backen.models import Base
+
+    Base.metadata.create_all(bind=conn)
+
+
+def _summary_columns(conn):
+    # bypassed_events_count stays NULL: backen results do not report it
+    for column, ddl in (("detected", "BOOLEAN"), ("alert_count", "INTEGER"), ("event_count", "INTEGER"), ("bypassed_events_count", "INTEGER"), ("duration_ms", "FLOAT")):
+        add_column_if_missing(conn, "simulation_runs", column, ddl)
+    conn.execute(text(
+        "UPDATE simulation_runs SET "
+        "detected = json_extract(result_summary, '$.detected'), "
+        "alert_count = json_array_length(result_summary, '$.alerts'), "
+        "event_count = json_array_length(result_summary, '$.event_sequence') "
+        "WHERE detected IS NULL AND result_summary IS NOT NULL"
+    ))
+    create_index_if_missing(conn, "ix_simulation_runs_detected", "simulation_runs", "detected")
+    create_index_if_missing(conn, "ix_simulation_runs_rule_id_created_at", "simulation_runs", "rule_id, created_at")
+
+
+def _result_cache_table(conn):
+    from backen.models import CachedResult
+
+    CachedResult.__table__.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "initial schema", _initial_schema),
+    (2, "simulation_runs (created_at, id) index", lambda conn: create_index_if_missing(conn, "ix_simulation_runs_created_at_id", "simulation_runs", "created_at, id")),
+    (3, "simulation_runs summary columns", _summary_columns),
+    (4, "result_cache table", _result_cache_table),
+    (5, "result_cache created_at index", lambda conn: create_index_if_missing(conn, "ix_result_cache_created_at", "result_cache", "created_at")),
+]
+
+
+def upgrade(engine=None) -> int:
+    """Bring the backen database up to the latest schema version."""
+    if engine is None:
+        from backen.database import engine
+    return run_migrations(engine, MIGRATIONS)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Depends, Query, Request
 from typing import Any, Dict
-from backen.services.gemini_client import generate_red_scenario_from_rule, generate_blue_patch_from_log
+from backen.services.gemini_client import generate_red_scenario_from_rule, generate_blue_patch_from_log, stream_red_scenario
 from backen.database import get_db
 from backen.models import AIGeneratedScenario, Patch
 from backen.schemas import ScenarioModel
+from backen.utils.prompt_cache import cache_bypassed
+from backen.utils.streaming import streaming_response
 from sqlalchemy.orm import Session
 import uuid
 
@@ -11,10 +13,19 @@ router = APIRouter()
 
 
 @router.post("/red_team")
-async def red_team(rule_text: Any = Body(None), db: Session = Body(None)):
-    """Generate a red-team scenario. Falls back to local generator when AI unavailable."""
+async def red_team(request: Request, rule_text: Any = Body(None), stream: bool = Query(False), db: Session = Depends(get_db)):
+    """Generate a red-team scenario. Falls back to local generator when AI unavailable.
+
+    Repeated prompts are answered from the AI response cache unless the request
+    sends ``X-AI-Cache: bypass``. With ``stream=true`` events are sent as they
+    are parsed from the AI output, as NDJSON or, for ``Accept: text/event-stream``,
+    server-sent events; a final ``scenario`` message carries the scenario_id.
+    """
+    if stream:
+        messages = stream_red_scenario(rule_text, use_cache=not cache_bypassed(request.headers))
+        return streaming_response(messages, request.headers.get("accept", ""))
     try:
-        res = await generate_red_scenario_from_rule(rule_text)
+        res = await generate_red_scenario_from_rule(rule_text, use_cache=not cache_bypassed(request.headers))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     # persist AI generated scenario when parsed
@@ -30,8 +41,8 @@ async def red_team(rule_text: Any = Body(None), db: Session = Body(None)):
 
 
 @router.post("/blue_team")
-async def blue_team(attack_log: Dict[str, Any] = Body(...), current_rule: Dict[str, Any] = Body(...), db: Session = None):
-    res = await generate_blue_patch_from_log(attack_log, current_rule)
+async def blue_team(request: Request, attack_log: Dict[str, Any] = Body(...), current_rule: Dict[str, Any] = Body(...), db: Session = Depends(get_db)):
+    res = await generate_blue_patch_from_log(attack_log, current_rule, use_cache=not cache_bypassed(request.headers))
     patch_json = res.get("patch_json")
     raw = res.get("raw_ai_output")
     # persist patch
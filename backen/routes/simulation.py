@@ -1,78 +1,295 @@
-from fastapi import APIRouter, Depends, Body, Query, HTTPException
-from typing import Optional, Any
-from backen.database import get_db, create_tables
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from typing import Optional, Any, List
+from functools import partial
+from backen.database import get_async_db, bulk_insert
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from backen.models import Rule, SimulationRun, EventLog, Patch
-from backen.schemas import ScenarioModel, RunResultModel, RuleModel, PatchModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from backen.models import Rule, RuleState, SimulationRun, EventLog, Patch, CachedResult
+from backen.schemas import RunResultModel, RuleModel, PatchModel, SweepRequestModel
 from backen.utils.attack_scenarios import generate_relay_attack
-from backen.utils.rule_engine import evaluate_scenario
+from backen.utils.rule_engine import evaluate_scenario, output_events
+from backen.utils.rule_compiler import RuleCompileError, get_compiled_rule
+from backen.utils.ingest import IngestError, ScenarioColumns, loads
+from backen.utils.parallel import parallel_map_async, run_off_loop, get_process_pool, Timed
+from backen.utils.analytics import rule_metrics_stmt, format_rule_metrics
+from backen.utils.sweep import build_grid, run_sweep, SWEEP_MAX_VARIANTS
+from backen.utils.rule_cache import ActiveRuleCache, CachedRule
+from backen.utils.result_cache import ResultCache, cache_key, strip_alert_ids, with_fresh_alert_ids
+from backen.utils.pagination import encode_cursor, keyset_page, parse_fields, raw_column
+from backen.utils.responses import trusted_response
+import asyncio
 import uuid
 
 router = APIRouter()
 
+active_rule_cache = ActiveRuleCache(Rule, RuleState)
+result_cache = ResultCache(CachedResult)
 
-@router.post("/run", response_model=RunResultModel)
-async def run_simulation(scenario: Optional[Any] = Body(None), db: Session = Depends(get_db)):
-    create_tables()
-    if not scenario:
-        scenario = generate_relay_attack()
-    else:
-        if not isinstance(scenario, ScenarioModel):
-            try:
-                scenario = ScenarioModel.parse_obj(scenario)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
-
-    active_rule = db.query(Rule).filter(Rule.active == True).first()
-    if not active_rule:
+# columns selectable through GET /logs?fields=...
+LOG_FIELDS = {
+    "run_id": SimulationRun.run_id,
+    "rule_id": SimulationRun.rule_id,
+    "created_at": SimulationRun.created_at,
+    "detected": SimulationRun.detected,
+    "alert_count": SimulationRun.alert_count,
+    "event_count": SimulationRun.event_count,
+    "bypassed_events_count": SimulationRun.bypassed_events_count,
+    "duration_ms": SimulationRun.duration_ms,
+    "result_summary": SimulationRun.result_summary,
+}
+LOG_FIELD_PRESETS = {"summary": ["run_id", "rule_id", "created_at", "detected", "alert_count", "event_count"]}
+
+
+def _load_active_rule(db: Session) -> CachedRule:
+    active_rule = active_rule_cache.get(db)
+    if active_rule is None:
         # seed default rule
         default = Rule(rule_id="loiter_v1", rule_json={"type": "loiter", "loiter_time_seconds": 60, "zone": "Z"}, description="Default loiter rule", active=True)
         db.add(default)
+        active_rule_cache.bump(db)
         db.commit()
-        active_rule = default
+        active_rule = active_rule_cache.get(db)
+    return active_rule
+
 
-    result = evaluate_scenario(scenario, active_rule.rule_json)
+@router.post("/run", response_model=RunResultModel)
+async def run_simulation(request: Request, use_cache: bool = Query(True), db: AsyncSession = Depends(get_async_db)):
+    scenario = await _read_scenario(request)
+
+    active_rule = await db.run_sync(_load_active_rule)
+
+    key = cache_key(scenario.event_sequence, active_rule.rule_json)
+    cached = await db.run_sync(result_cache.get, key) if use_cache else None
+    if cached is not None:
+        result, duration_ms = _cached_result(cached, scenario), None
+    else:
+        result, duration_ms = await run_off_loop(Timed(partial(evaluate_scenario, rule_json=active_rule.rule_json)), scenario, len(scenario.events))
+        if use_cache:
+            await db.run_sync(result_cache.put, key, _cache_payload(result))
 
     run_id = f"run_{uuid.uuid4().hex[:8]}"
-    sim = SimulationRun(run_id=run_id, rule_id=active_rule.rule_id, result_summary=result.dict())
+    result.run_id = run_id
+    sim = SimulationRun(run_id=run_id, rule_id=active_rule.rule_id, **_summary_columns(result, duration_ms))
     db.add(sim)
-    db.commit()
+    await db.run_sync(bulk_insert, EventLog, _event_rows(run_id, scenario))
+    await db.commit()
+    return trusted_response(result)
+
+
+def _cache_payload(result: RunResultModel) -> dict:
+    # the events come from the request on a hit: with RESULT_CACHE_IGNORE_IDS the
+    # cached run may have been a different scenario
+    return strip_alert_ids(jsonable_encoder(result, exclude={"run_id", "event_sequence"}))
+
+
+def _cached_result(payload: dict, scenario: ScenarioColumns) -> RunResultModel:
+    # cached payloads were produced by the engine, so they are not re-validated
+    return RunResultModel.construct(**dict(with_fresh_alert_ids(payload), event_sequence=output_events(scenario.events)))
+
+
+def _summary_columns(result: RunResultModel, duration_ms: Optional[float]) -> dict:
+    return {
+        "result_summary": jsonable_encoder(result),
+        "detected": result.detected,
+        "alert_count": len(result.alerts),
+        "event_count": len(result.event_sequence),
+        # the backen engine does not count bypassed events yet
+        "bypassed_events_count": None,
+        # NULL for cache hits, so AVG(duration_ms) only covers real evaluations
+        "duration_ms": duration_ms,
+    }
+
+
+def _event_rows(run_id: str, scenario: ScenarioColumns):
+    ev = scenario.events
+    for idx, (entity_id, entity_type, action, coords, meta) in enumerate(zip(ev.entity_id, ev.entity_type, ev.action, ev.coords, ev.metadata)):
+        yield {"run_id": run_id, "event_index": idx, "entity_id": entity_id, "entity_type": entity_type, "action": action, "coords": coords, "meta": meta or {}, "result": None}
+
+
+async def _read_scenario(request: Request) -> ScenarioColumns:
+    # an omitted body or an empty object means 'generate a scenario'
+    body = await request.body()
+    try:
+        payload = loads(body) if body.strip() else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
+    if not payload:
+        return ScenarioColumns.from_model(generate_relay_attack())
+    try:
+        return ScenarioColumns.parse(payload)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
+
+
+async def _read_batch_payload(request: Request) -> List[Any]:
+    # JSON array, {"scenarios": [...]} or NDJSON with one scenario per line
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            return [loads(line) for line in body.splitlines() if line.strip()]
+        payload = loads(body or b"[]")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch payload: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get("scenarios", [])
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Batch payload must be a list of scenarios")
+    return payload
+
 
-    for idx, ev in enumerate(scenario.event_sequence):
-        log = EventLog(run_id=run_id, event_index=idx, entity_id=ev.entity_id, entity_type=ev.entity_type, action=ev.action, coords=ev.coords, meta=ev.metadata or {}, result=None)
-        db.add(log)
-    db.commit()
+@router.post("/run_batch")
+async def run_simulation_batch(request: Request, use_cache: bool = Query(True), db: AsyncSession = Depends(get_async_db)):
+    """Evaluate many scenarios against the active rule, loaded once, and bulk-persist the runs.
 
-    out = result
-    out.run_id = run_id
-    return out
+    Scenarios already in the result cache are not re-evaluated; pass use_cache=false to force it.
+    """
+    payload = await _read_batch_payload(request)
+    scenarios = []
+    for idx, item in enumerate(payload):
+        try:
+            scenarios.append(ScenarioColumns.parse(item))
+        except IngestError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid scenario payload at index {idx}: {e}")
+
+    active_rule = await db.run_sync(_load_active_rule)
+
+    timed = await _evaluate_cached(db, scenarios, active_rule.rule_json, use_cache)
+    results = [result for result, _ in timed]
+
+    runs = []
+    for result, ms in timed:
+        result.run_id = f"run_{uuid.uuid4().hex[:8]}"
+        runs.append(dict(run_id=result.run_id, rule_id=active_rule.rule_id, **_summary_columns(result, ms)))
+    await db.run_sync(bulk_insert, SimulationRun, runs)
+    await db.run_sync(bulk_insert, EventLog, (row for scenario, result in zip(scenarios, results) for row in _event_rows(result.run_id, scenario)))
+    await db.commit()
+
+    return trusted_response({"results": results, "count": len(results), "detected_count": sum(1 for r in results if r.detected)})
+
+
+async def _evaluate_cached(db: AsyncSession, scenarios: List[ScenarioColumns], rule_json, use_cache: bool):
+    """(result, duration_ms) per scenario; cache hits have no duration (None) and only misses hit the pool."""
+    if not use_cache:
+        return await parallel_map_async(Timed(partial(evaluate_scenario, rule_json=rule_json)), scenarios)
+
+    keys = [cache_key(scenario.event_sequence, rule_json) for scenario in scenarios]
+    cached = await db.run_sync(result_cache.get_many, keys)
+    # identical scenarios within one batch are evaluated once
+    todo = {}
+    for key, scenario in zip(keys, scenarios):
+        if key not in cached and key not in todo:
+            todo[key] = scenario
+    fresh = dict(zip(todo, await parallel_map_async(Timed(partial(evaluate_scenario, rule_json=rule_json)), list(todo.values()))))
+    payloads = dict(cached)
+    payloads.update((key, _cache_payload(result)) for key, (result, _) in fresh.items())
+    if fresh:
+        await db.run_sync(result_cache.put_many, {key: payloads[key] for key in fresh})
+
+    timed = []
+    for key, scenario in zip(keys, scenarios):
+        if key in fresh:
+            timed.append(fresh.pop(key))
+        else:
+            timed.append((_cached_result(payloads[key], scenario), None))
+    return timed
+
+
+@router.post("/sweep")
+async def sweep(req: SweepRequestModel, db: AsyncSession = Depends(get_async_db)):
+    """Sweep generated relay attacks over a parameter grid and report detection/bypass rates per cell.
+
+    Uses ``req.rule_json`` when given, otherwise the active rule.
+    """
+    grid = build_grid(req.drop_delay_seconds, req.pickup_delay_seconds, req.noise_m)
+    if req.variants_per_cell < 1 or not grid:
+        raise HTTPException(status_code=400, detail="Sweep needs at least one grid cell and one variant per cell")
+    if len(grid) * req.variants_per_cell > SWEEP_MAX_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Sweep exceeds {SWEEP_MAX_VARIANTS} variants")
+
+    rule_json = req.rule_json
+    if rule_json is not None:
+        _validate_rule(rule_json)
+    else:
+        active_rule = await db.run_sync(active_rule_cache.get)
+        rule_json = active_rule.rule_json if active_rule else None
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(run_sweep, rule_json, grid, req.variants_per_cell, executor=get_process_pool(), seed=req.seed))
+
+
+def _validate_rule(rule_json) -> None:
+    try:
+        get_compiled_rule(rule_json)
+    except RuleCompileError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule: {e}")
 
 
 @router.post("/apply_patch", response_model=RuleModel)
-async def apply_patch(patch: PatchModel, db: Session = Depends(get_db)):
-    create_tables()
+async def apply_patch(patch: PatchModel, db: AsyncSession = Depends(get_async_db)):
+    _validate_rule(patch.patch_json or {})
     patch_id = patch.patch_id or f"patch_{uuid.uuid4().hex[:8]}"
     p = Patch(patch_id=patch_id, patch_json=patch.patch_json or {}, description=patch.description)
     db.add(p)
-    db.query(Rule).update({Rule.active: False})
+    await db.execute(update(Rule).values(active=False))
     rule_id = patch.patch_json.get("rule_id") if patch.patch_json else f"rule_{uuid.uuid4().hex[:8]}"
     new_rule = Rule(rule_id=rule_id, rule_json=patch.patch_json or {}, description=patch.description or "Applied patch", active=True)
     db.add(new_rule)
-    db.commit()
+    await db.run_sync(active_rule_cache.bump)
+    await db.commit()
     return RuleModel(rule_id=new_rule.rule_id, rule_json=new_rule.rule_json, description=new_rule.description, active=new_rule.active)
 
 
 @router.get("/logs")
-async def get_logs(limit: int = Query(20, ge=1, le=200), offset: int = 0, db: Session = Depends(get_db)):
-    create_tables()
-    runs = db.query(SimulationRun).order_by(SimulationRun.created_at.desc()).limit(limit).offset(offset).all()
-    return {"runs": [r.result_summary for r in runs], "count": len(runs)}
+async def get_logs(
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Return past simulation runs, newest first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to fetch the next page
+    (keyset pagination on ``(created_at, id)``); ``offset`` is only honoured
+    without a cursor. ``fields=summary`` (or a comma list of LOG_FIELDS)
+    returns compact rows instead of the full ``result_summary`` blobs.
+    """
+    try:
+        names = parse_fields(fields, LOG_FIELDS, LOG_FIELD_PRESETS)
+        stmt = select(SimulationRun.id, raw_column(SimulationRun.created_at, "cursor_created"), *[LOG_FIELDS[n].label(n) for n in (names or ["result_summary"])])
+        stmt = keyset_page(stmt, SimulationRun.created_at, SimulationRun.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if offset and not cursor:
+        stmt = stmt.offset(offset)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].cursor_created, rows[-1].id)
+    if names is None:
+        runs = [r.result_summary for r in rows]
+    else:
+        runs = [{n: (bool(r[n]) if n == "detected" and r[n] is not None else r[n]) for n in names} for r in rows]
+    return trusted_response({"runs": runs, "count": len(runs), "next_cursor": next_cursor})
+
+
+@router.get("/metrics")
+async def get_rule_metrics(window_hours: Optional[float] = Query(None, gt=0), db: AsyncSession = Depends(get_async_db)):
+    """Per-rule detection/bypass metrics computed in SQL from the run summary columns.
+
+    ``window_hours`` limits the aggregate to recent runs (e.g. 24 for the last day).
+    """
+    rows = (await db.execute(rule_metrics_stmt(SimulationRun, window_hours))).all()
+    return {"rules": format_rule_metrics(rows)}
 
 
 @router.get("/rule")
-async def get_active_rule(db: Session = Depends(get_db)):
-    create_tables()
-    rule = db.query(Rule).filter(Rule.active == True).first()
+async def get_active_rule(db: AsyncSession = Depends(get_async_db)):
+    rule = await db.run_sync(active_rule_cache.get)
     if not rule:
         return {"rule": None}
     return {"rule": {"rule_id": rule.rule_id, "rule_json": rule.rule_json, "description": rule.description, "active": rule.active}}
@@ -39,6 +39,15 @@ class RunResultModel(BaseModel):
     raw_ai_output: Optional[Any] = None
 
 
+class SweepRequestModel(BaseModel):
+    rule_json: Optional[Dict[str, Any]] = None
+    drop_delay_seconds: List[int] = [45]
+    pickup_delay_seconds: List[int] = [180]
+    noise_m: List[float] = [0.0002]
+    variants_per_cell: int = 100
+    seed: int = 0
+
+
 class GeminiResponseModel(BaseModel):
     parsed_json: Optional[Dict[str, Any]]
     raw: Optional[str]
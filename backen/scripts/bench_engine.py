@@ -0,0 +1,82 @@
+"""Microbenchmark the rule engine on a synthetic replay.
+
+Example:
+    python backen/scripts/bench_engine.py --events 200000 --entities 500 --repeat 5
+"""
+import sys
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backen.schemas import ScenarioModel
+from backen.utils.ingest import ScenarioColumns, loads
+from backen.utils.rule_engine import evaluate_scenario, StreamingEvaluator
+
+RULES = {
+    "loiter": {"type": "loiter", "loiter_time_seconds": 600},
+    "loiter_radius": {"type": "loiter", "params": {"radius_m": 15, "min_duration_s": 600}},
+    "handoff": {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 600, "coords_radius_meters": 10, "required_event_sequence": ["drop", "pickup"]},
+}
+
+
+def make_events(n: int, entities: int, seed: int):
+    rng = random.Random(seed)
+    events = []
+    t = 0
+    for _ in range(n):
+        t += rng.randint(0, 3)
+        events.append({
+            "entity_id": f"E{rng.randrange(entities)}",
+            "action": rng.choice(("move", "move", "move", "drop", "pickup")),
+            "timestamp_offset_seconds": t,
+            "coords": [31.62 + rng.random() * 0.01, 74.87 + rng.random() * 0.01],
+            "entity_type": "person",
+        })
+    return events
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of this many runs")
+    parser.add_argument("--rules", default=",".join(RULES), help=f"comma-separated subset of {', '.join(RULES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    events = make_events(args.events, args.entities, args.seed)
+    scenario = {"event_sequence": events}
+    print(f"{args.events} events, {args.entities} entities, best of {args.repeat}")
+
+    # ingestion of the same JSON body: Pydantic models vs. columns
+    body = json.dumps({"scenario_id": "bench", "event_sequence": events}).encode()
+    models = best_of(lambda: ScenarioModel.parse_raw(body), args.repeat)
+    columns = best_of(lambda: ScenarioColumns.parse(loads(body)), args.repeat)
+    print(f"{'ingest':>14}  ScenarioModel.parse_raw {models * 1000:8.1f} ms  ScenarioColumns.parse {columns * 1000:8.1f} ms")
+    parsed = ScenarioColumns.parse(loads(body))
+
+    for name in args.rules.split(","):
+        rule = RULES[name]
+        batch = best_of(lambda: evaluate_scenario(scenario, rule), args.repeat)
+        cols = best_of(lambda: evaluate_scenario(parsed, rule), args.repeat)
+        stream = best_of(lambda: StreamingEvaluator(rule).push_many(events), args.repeat)
+        print(f"{name:>14}  evaluate_scenario dicts {batch * 1000:8.1f} ms  columns {cols * 1000:8.1f} ms"
+              f"  streaming {stream * 1000:8.1f} ms ({args.events / stream:10.0f} ev/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,22 @@ ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from backen.database import create_tables, SessionLocal
-from backen.models import Rule
+from backen.database import engine, SessionLocal
+from backen.migrations import upgrade
+from backen.models import Rule, RuleState
+from backen.utils.rule_cache import ActiveRuleCache
 
 
 def main():
-    create_tables()
+    version = upgrade(engine)
+    print(f"Schema at version {version}")
     db = SessionLocal()
     try:
         exists = db.query(Rule).first()
         if not exists:
             r = Rule(rule_id="loiter_v1", rule_json={"type": "loiter", "loiter_time_seconds": 60, "zone": "Z"}, description="Default loiter detection rule", active=True)
             db.add(r)
+            ActiveRuleCache(Rule, RuleState).bump(db)
             db.commit()
             print("Inserted default rule loiter_v1")
         else:
@@ -0,0 +1,64 @@
+"""Sweep generated relay attacks over a parameter grid against a rule.
+
+Example:
+    python backen/scripts/sweep.py --rule '{"rule_id": "stateful_handoff_v2"}' \
+        --drop-delays 30:90:15 --pickup-delays 120,180,600 --noise 0.0001,0.0005 --variants 1000
+"""
+import sys
+import json
+import argparse
+import time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backen.utils.sweep import build_grid, run_sweep
+
+
+def _parse_values(spec: str, cast):
+    """'a,b,c' or 'start:stop:step' (stop inclusive); raises ArgumentTypeError for bad specs."""
+    try:
+        if ":" not in spec:
+            return [cast(x) for x in spec.split(",") if x]
+        start, stop, step = (cast(x) for x in spec.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'a,b,c' or 'start:stop:step' of {cast.__name__} values, got {spec!r}")
+    if step <= 0:
+        raise argparse.ArgumentTypeError(f"step must be positive in {spec!r}")
+    out = []
+    v = start
+    while v <= stop:
+        out.append(v)
+        nxt = cast(v + step)
+        if nxt <= v:
+            raise argparse.ArgumentTypeError(f"step is too small to advance past {v} in {spec!r}")
+        v = nxt
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rule", help="rule JSON string or path to a JSON file (default: loiter_v1)")
+    parser.add_argument("--drop-delays", type=lambda s: _parse_values(s, int), default="45")
+    parser.add_argument("--pickup-delays", type=lambda s: _parse_values(s, int), default="180")
+    parser.add_argument("--noise", type=lambda s: _parse_values(s, float), default="0.0002")
+    parser.add_argument("--variants", type=int, default=100, help="variants per grid cell")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rule_json = None
+    if args.rule:
+        path = Path(args.rule)
+        rule_json = json.loads(path.read_text() if path.is_file() else args.rule)
+
+    grid = build_grid(args.drop_delays, args.pickup_delays, args.noise)
+    started = time.perf_counter()
+    report = run_sweep(rule_json, grid, args.variants, workers=args.workers, seed=args.seed)
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,111 @@
 """Gemini client wrapper with fallbacks to local generators."""
 import os
 import json
-import asyncio
-from typing import Any, Dict
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Optional
 import httpx
 from dotenv import load_dotenv
 from backen.utils.attack_scenarios import generate_relay_attack
+from backen.services.http_client import post_with_retries, stream_with_retries, RED_TEAM_TIMEOUT, BLUE_TEAM_TIMEOUT
+from backen.utils.resilience import CircuitOpenError
+from backen.utils.prompt_cache import PromptCache, prompt_key
+from backen.utils.single_flight import SingleFlight
+from backen.utils.json_stream import scenario_messages
+from backen.database import AsyncSessionLocal
+from backen.models import AIGeneratedScenario
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT")
 
+prompt_cache = PromptCache(AIGeneratedScenario, AsyncSessionLocal)
+# concurrent identical prompts share one upstream call
+inflight = SingleFlight()
 
-async def call_gemini(prompt: str, max_tokens: int = 512) -> Dict[str, Any]:
+
+async def call_gemini(prompt: str, max_tokens: int = 512, timeout: Optional[float] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """Gemini response for ``prompt``, served from the prompt cache when possible.
+
+    ``use_cache=False`` skips the lookup but still stores a successful response.
+    Concurrent calls for the same prompt share one upstream request.
+    """
     if not GOOGLE_API_KEY or not GEMINI_ENDPOINT:
         return {"error": "no_key_or_endpoint", "raw": f"Missing GOOGLE_API_KEY or GEMINI_ENDPOINT: use fallback"}
+    key = prompt_key(GEMINI_ENDPOINT, prompt, max_tokens)
+    if use_cache:
+        cached = await prompt_cache.get(key)
+        if cached is not None:
+            return cached
+    return await inflight.run(key, partial(_fetch_and_cache, key, prompt, max_tokens, timeout))
+
+
+async def _fetch_and_cache(key: str, prompt: str, max_tokens: int, timeout: Optional[float]) -> Dict[str, Any]:
+    resp = await _post_gemini(prompt, max_tokens, timeout)
+    if not resp.get("error"):
+        await prompt_cache.put(key, resp)
+    return resp
+
 
+async def _post_gemini(prompt: str, max_tokens: int, timeout: Optional[float]) -> Dict[str, Any]:
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {GOOGLE_API_KEY}"}
     payload = {"prompt": prompt, "max_tokens": max_tokens}
-    retries = 2
-    backoff = 0.5
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        for attempt in range(retries + 1):
-            try:
-                r = await client.post(GEMINI_ENDPOINT, json=payload, headers=headers)
-                text = r.text
-                try:
-                    parsed = r.json()
-                    return {"parsed": parsed, "raw": text}
-                except Exception:
-                    return {"parsed": None, "raw": text}
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                if attempt < retries:
-                    await asyncio.sleep(backoff * (attempt + 1))
-                    continue
-                return {"error": str(e)}
-
-
-async def generate_red_scenario_from_rule(rule_text_or_json: Any) -> Dict[str, Any]:
-    prompt = f"You are an adversarial generator. The detection rule is: {json.dumps(rule_text_or_json)}. Output ONLY JSON with keys: scenario_id, description, event_sequence (each event: entity_id, entity_type, action, timestamp_offset_seconds, coords, metadata)."
-    resp = await call_gemini(prompt)
+    # shared pooled client with concurrency/rate limits, retries and a circuit breaker (see http_client.py)
+    try:
+        r = await post_with_retries(GEMINI_ENDPOINT, json=payload, headers=headers, timeout=timeout)
+    except CircuitOpenError as e:
+        return {"error": "circuit_open", "raw": str(e)}
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        return {"error": str(e)}
+    text = r.text
+    try:
+        parsed = r.json()
+        return {"parsed": parsed, "raw": text}
+    except Exception:
+        return {"parsed": None, "raw": text}
+
+
+async def stream_gemini(prompt: str, max_tokens: int = 512, timeout: Optional[float] = None, use_cache: bool = True) -> AsyncIterator[str]:
+    """Gemini output as text chunks while it arrives; a cached response is replayed as one chunk.
+
+    The complete body is stored in the prompt cache under its own key
+    (``stream=True``), so it never answers a ``call_gemini`` call or vice versa.
+    """
+    if not GOOGLE_API_KEY or not GEMINI_ENDPOINT:
+        raise RuntimeError("Missing GOOGLE_API_KEY or GEMINI_ENDPOINT: use fallback")
+    key = prompt_key(GEMINI_ENDPOINT, prompt, max_tokens, stream=True)
+    if use_cache:
+        cached = await prompt_cache.get(key)
+        if cached is not None:
+            yield cached["raw"]
+            return
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {GOOGLE_API_KEY}"}
+    payload = {"prompt": prompt, "max_tokens": max_tokens, "stream": True}
+    parts = []
+    async for chunk in stream_with_retries(GEMINI_ENDPOINT, json=payload, headers=headers, timeout=timeout):
+        parts.append(chunk)
+        yield chunk
+    text = "".join(parts)
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        parsed = None
+    await prompt_cache.put(key, {"parsed": parsed, "raw": text})
+
+
+def _red_team_prompt(rule_text_or_json: Any) -> str:
+    return f"You are an adversarial generator. The detection rule is: {json.dumps(rule_text_or_json)}. Output ONLY JSON with keys: scenario_id, description, event_sequence (each event: entity_id, entity_type, action, timestamp_offset_seconds, coords, metadata)."
+
+
+def stream_red_scenario(rule_text_or_json: Any, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """Red-team scenario as stream messages (see ``json_stream.scenario_messages``)."""
+    chunks = stream_gemini(_red_team_prompt(rule_text_or_json), timeout=RED_TEAM_TIMEOUT, use_cache=use_cache)
+    return scenario_messages(chunks, generate_relay_attack)
+
+
+async def generate_red_scenario_from_rule(rule_text_or_json: Any, use_cache: bool = True) -> Dict[str, Any]:
+    prompt = _red_team_prompt(rule_text_or_json)
+    resp = await call_gemini(prompt, timeout=RED_TEAM_TIMEOUT, use_cache=use_cache)
     if resp.get("error"):
         return {"scenario": generate_relay_attack().dict(), "raw_ai_output": resp}
     if resp.get("parsed"):
@@ -53,9 +118,9 @@ async def generate_red_scenario_from_rule(rule_text_or_json: Any) -> Dict[str, A
         return {"scenario": generate_relay_attack().dict(), "raw_ai_output": resp.get("raw")}
 
 
-async def generate_blue_patch_from_log(attack_log: Dict[str, Any], current_rule: Dict[str, Any]) -> Dict[str, Any]:
+async def generate_blue_patch_from_log(attack_log: Dict[str, Any], current_rule: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
     prompt = "You are a defensive AI analyst. Input: attack_log JSON and current_rule JSON. Produce EXACTLY one valid JSON patch with keys: rule_id, trigger_conditions, temporal_window_seconds, coords_radius_meters, required_event_sequence, description. Return only JSON."
-    resp = await call_gemini(prompt + "\nAttack log:" + json.dumps(attack_log) + "\nCurrent rule:" + json.dumps(current_rule))
+    resp = await call_gemini(prompt + "\nAttack log:" + json.dumps(attack_log) + "\nCurrent rule:" + json.dumps(current_rule), timeout=BLUE_TEAM_TIMEOUT, use_cache=use_cache)
     fallback = {"rule_id":"stateful_handoff_v2","trigger_conditions":[{"event":"drop"}],"temporal_window_seconds":600,"coords_radius_meters":10,"required_event_sequence":["drop","pickup"],"description":"fallback patch suggested by system"}
     if resp.get("error"):
         return {"patch_json": fallback, "raw_ai_output": resp}
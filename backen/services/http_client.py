@@ -0,0 +1,187 @@
+"""Application-lifetime httpx client for the Gemini calls.
+
+One ``AsyncClient`` is opened on app startup (``start_client``) and closed on
+shutdown (``close_client``) so red/blue-team calls reuse pooled keep-alive
+connections instead of paying TCP/TLS setup per request. ``get_client`` opens
+one lazily for scripts that call the services outside the app.
+
+HTTP/2 (``GEMINI_HTTP2=1``) needs the optional ``h2`` package
+(``pip install httpx[http2]``); without it the client stays on HTTP/1.1.
+
+``post_with_retries`` (and ``stream_with_retries`` for streamed bodies) is the
+resilience layer every Gemini POST goes through:
+at most ``GEMINI_MAX_CONCURRENCY`` requests in flight, a token bucket sized to
+the quota (``GEMINI_RATE_PER_SEC``/``GEMINI_BURST``), exponential backoff with
+jitter on transport errors, 429 and 5xx (honouring Retry-After), and a circuit
+breaker that fails fast with ``CircuitOpenError`` after repeated failures so
+callers drop to their local fallbacks instead of waiting out timeouts.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+from backen.utils.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay, parse_retry_after
+
+logger = logging.getLogger("gemini_http")
+
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+# per-endpoint read timeouts; unset falls back to GEMINI_TIMEOUT
+RED_TEAM_TIMEOUT = float(os.getenv("GEMINI_RED_TEAM_TIMEOUT", GEMINI_TIMEOUT))
+BLUE_TEAM_TIMEOUT = float(os.getenv("GEMINI_BLUE_TEAM_TIMEOUT", GEMINI_TIMEOUT))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "10"))
+GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "30"))
+GEMINI_HTTP2 = os.getenv("GEMINI_HTTP2", "0") in ("1", "true", "yes")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# requests per second allowed by the API quota; 0 disables rate limiting
+GEMINI_RATE_PER_SEC = float(os.getenv("GEMINI_RATE_PER_SEC", "5"))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "10"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+# created with the client: an asyncio.Semaphore belongs to the loop that first waits on it
+_slots: Optional[asyncio.Semaphore] = None
+rate_limiter = TokenBucket(GEMINI_RATE_PER_SEC, GEMINI_BURST)
+breaker = CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_RESET)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client(**kwargs: Any) -> httpx.AsyncClient:
+    """A pooled client from the GEMINI_* settings; ``kwargs`` override them (e.g. ``transport``)."""
+    http2 = GEMINI_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("GEMINI_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+        http2 = False
+    options = dict(
+        limits=httpx.Limits(max_connections=GEMINI_MAX_CONNECTIONS, max_keepalive_connections=GEMINI_MAX_KEEPALIVE, keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(GEMINI_TIMEOUT, connect=GEMINI_CONNECT_TIMEOUT),
+        http2=http2,
+    )
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
+
+async def start_client(**kwargs: Any) -> httpx.AsyncClient:
+    """Open the shared client (app startup); a no-op when it is already open."""
+    global _client, _slots
+    if _client is None:
+        _client = build_client(**kwargs)
+        _slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client and its pooled connections (app shutdown)."""
+    global _client, _slots
+    client, _client, _slots = _client, None, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client, _slots
+    if _client is None:
+        _client = build_client()
+        _slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _client
+
+
+def request_timeout(seconds: Optional[float]) -> Any:
+    """Per-request timeout for ``client.post(..., timeout=...)``; None keeps the client default."""
+    if seconds is None:
+        return httpx.USE_CLIENT_DEFAULT
+    return httpx.Timeout(seconds, connect=GEMINI_CONNECT_TIMEOUT)
+
+
+async def post_with_retries(url: str, timeout: Optional[float] = None, **kwargs: Any) -> httpx.Response:
+    """POST through the shared client with the limits above; returns the 2xx response.
+
+    Raises ``CircuitOpenError`` without calling upstream while the breaker is
+    open, ``httpx.HTTPStatusError`` for a 429/5xx that outlived the retries (or
+    any other error status) and ``httpx.RequestError`` for transport failures.
+    """
+    client = get_client()
+    for attempt in range(GEMINI_RETRIES + 1):
+        breaker.check()
+        retry_after = None
+        try:
+            await rate_limiter.acquire()
+            async with _slots:
+                r = await client.post(url, timeout=request_timeout(timeout), **kwargs)
+            r.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in RETRY_STATUS:
+                # the upstream answered; the request itself is wrong
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == GEMINI_RETRIES:
+                raise
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+        except httpx.RequestError:
+            breaker.record_failure()
+            if attempt == GEMINI_RETRIES:
+                raise
+        else:
+            breaker.record_success()
+            return r
+        delay = backoff_delay(attempt, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, retry_after)
+        logger.info("Gemini call failed (attempt %d), retrying in %.2fs", attempt + 1, delay)
+        await asyncio.sleep(delay)
+
+
+async def stream_with_retries(url: str, timeout: Optional[float] = None, **kwargs: Any) -> AsyncIterator[str]:
+    """Like ``post_with_retries`` but yields the response body as text chunks.
+
+    Retries only happen before the first chunk is yielded; a failure after
+    that is raised to the consumer. The concurrency slot is held until the
+    body has been read (or the consumer stops iterating).
+    """
+    client = get_client()
+    for attempt in range(GEMINI_RETRIES + 1):
+        breaker.check()
+        retry_after = None
+        started = False
+        try:
+            await rate_limiter.acquire()
+            async with _slots:
+                async with client.stream("POST", url, timeout=request_timeout(timeout), **kwargs) as r:
+                    r.raise_for_status()
+                    async for chunk in r.aiter_text():
+                        started = True
+                        yield chunk
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in RETRY_STATUS:
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == GEMINI_RETRIES:
+                raise
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+        except httpx.RequestError:
+            breaker.record_failure()
+            if started or attempt == GEMINI_RETRIES:
+                raise
+        else:
+            breaker.record_success()
+            return
+        delay = backoff_delay(attempt, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, retry_after)
+        logger.info("Gemini stream failed (attempt %d), retrying in %.2fs", attempt + 1, delay)
+        await asyncio.sleep(delay)
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# keep route tests off the developer's relay.db
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test_relay.db"))
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backen.services import gemini_client, http_client
+from backen.utils.attack_scenarios import generate_relay_attack
+from backen.utils.prompt_cache import PromptCache
+from backen.utils.resilience import CircuitBreaker, TokenBucket
+
+
+class _StubGemini(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+    peers = []
+    delay = 0.0
+    statuses = []  # status codes to answer with before falling back to 200
+
+    def do_POST(self):
+        self.peers.append(self.client_address)
+        time.sleep(self.delay)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("stream"):
+            return self._stream_scenario()
+        status = self.statuses.pop(0) if self.statuses else 200
+        out = json.dumps({"scenario_id": "stub", "prompt_chars": len(body["prompt"])}).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def _stream_scenario(self):
+        scenario = json.loads(generate_relay_attack().json())
+        scenario["scenario_id"] = "streamed"
+        _StubGemini.streamed = scenario
+        text = json.dumps(scenario)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(text), 64):
+            part = text[i:i + 64].encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_endpoint(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGemini)
+    _StubGemini.peers = []
+    _StubGemini.delay = 0.0
+    _StubGemini.statuses = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(gemini_client, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_client, "GEMINI_ENDPOINT", f"http://127.0.0.1:{server.server_port}/generate")
+    monkeypatch.setattr(gemini_client, "prompt_cache", PromptCache())
+    monkeypatch.setattr(http_client, "breaker", CircuitBreaker(threshold=3, reset_after=60))
+    monkeypatch.setattr(http_client, "rate_limiter", TokenBucket(rate=0, capacity=1))
+    monkeypatch.setattr(http_client, "GEMINI_BACKOFF_BASE", 0.01)
+    yield _StubGemini.peers
+    server.shutdown()
+    server.server_close()
+
+
+def test_calls_reuse_one_pooled_connection(stub_endpoint):
+    async def scenario():
+        await http_client.start_client()
+        try:
+            return [await gemini_client.call_gemini(f"prompt {i}", timeout=5) for i in range(5)]
+        finally:
+            await http_client.close_client()
+
+    results = asyncio.run(scenario())
+    assert [r["parsed"]["scenario_id"] for r in results] == ["stub"] * 5
+    assert len(stub_endpoint) == 5
+    assert len(set(stub_endpoint)) == 1
+
+
+def test_red_team_uses_stub_response(stub_endpoint):
+    async def scenario():
+        await http_client.start_client()
+        try:
+            return await gemini_client.generate_red_scenario_from_rule({"type": "loiter"})
+        finally:
+            await http_client.close_client()
+
+    assert asyncio.run(scenario())["scenario"]["scenario_id"] == "stub"
+
+
+def test_repeated_prompt_is_served_from_cache_unless_bypassed(stub_endpoint):
+    async def scenario():
+        await http_client.start_client()
+        try:
+            first = await gemini_client.call_gemini("same prompt")
+            again = await gemini_client.call_gemini("same prompt")
+            fresh = await gemini_client.call_gemini("same prompt", use_cache=False)
+            return first, again, fresh
+        finally:
+            await http_client.close_client()
+
+    first, again, fresh = asyncio.run(scenario())
+    assert first == again == fresh
+    assert len(stub_endpoint) == 2
+
+
+def test_concurrent_identical_prompts_share_one_upstream_call(stub_endpoint):
+    _StubGemini.delay = 0.1
+
+    async def scenario():
+        await http_client.start_client()
+        try:
+            return await asyncio.gather(*[gemini_client.call_gemini("burst prompt", use_cache=False) for _ in range(5)])
+        finally:
+            await http_client.close_client()
+
+    results = asyncio.run(scenario())
+    assert all(r == results[0] for r in results)
+    assert len(stub_endpoint) == 1
+
+
+def test_retries_429_and_5xx_then_falls_back_and_opens_circuit(stub_endpoint):
+    async def scenario():
+        await http_client.start_client()
+        try:
+            _StubGemini.statuses = [429, 503]
+            recovered = await gemini_client.call_gemini("flaky")
+            _StubGemini.statuses = [500] * 3
+            failed = await gemini_client.generate_red_scenario_from_rule({"type": "loiter"})
+            calls_before = len(stub_endpoint)
+            short_circuited = await gemini_client.call_gemini("another prompt")
+            return recovered, failed, calls_before, short_circuited
+        finally:
+            await http_client.close_client()
+
+    recovered, failed, calls_before, short_circuited = asyncio.run(scenario())
+    assert recovered["parsed"]["scenario_id"] == "stub"
+    assert calls_before == 3 + 3
+    # 5xx bodies are errors, not scenarios: the local generator takes over
+    assert failed["scenario"]["event_sequence"] and "500" in failed["raw_ai_output"]["error"]
+    assert short_circuited["error"] == "circuit_open"
+    assert len(stub_endpoint) == calls_before
+
+
+def test_streamed_red_team_scenario_is_forwarded_event_by_event(stub_endpoint):
+    async def scenario():
+        await http_client.start_client()
+        try:
+            first = [m async for m in gemini_client.stream_red_scenario({"type": "loiter"})]
+            # the complete body was cached; the replay needs no upstream call
+            replay = [m async for m in gemini_client.stream_red_scenario({"type": "loiter"})]
+            # the same prompt without streaming is a different upstream request
+            plain = await gemini_client.generate_red_scenario_from_rule({"type": "loiter"})
+            return first, replay, plain
+        finally:
+            await http_client.close_client()
+
+    first, replay, plain = asyncio.run(scenario())
+    events = [m["event"] for m in first if m["type"] == "event"]
+    assert events == _StubGemini.streamed["event_sequence"]
+    assert first[-1]["scenario_id"] == "streamed" and first[-1]["source"] == "ai"
+    assert replay == first
+    assert plain["scenario"]["scenario_id"] == "stub"
+    assert len(stub_endpoint) == 2
+
+
+def test_red_team_stream_endpoint_falls_back_to_local_generator(monkeypatch):
+    from fastapi.testclient import TestClient
+    from backen.main import app
+
+    monkeypatch.setattr(gemini_client, "GOOGLE_API_KEY", None)
+    client = TestClient(app)
+    r = client.post("/ai/red_team", params={"stream": "true"}, json=None)
+    assert r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[-1]["type"] == "scenario" and lines[-1]["source"] == "fallback"
+
+    r = client.post("/ai/red_team", params={"stream": "true"}, headers={"Accept": "text/event-stream"})
+    assert r.text.startswith("event: event\ndata: ")
@@ -0,0 +1,29 @@
+import numpy as np
+
+from backen.utils.geodesy import distance_meters, distances_to_many, haversine_meters, haversine_to_many, equirect_to_many, pairwise_distances, within_radius
+
+
+def test_vector_kernels_match_scalar_haversine():
+    rng = np.random.default_rng(3)
+    lats = 31.62 + rng.uniform(-0.005, 0.005, 50)
+    lons = 74.87 + rng.uniform(-0.005, 0.005, 50)
+    expected = np.array([haversine_meters([31.62, 74.87], [a, b]) for a, b in zip(lats, lons)])
+    assert np.allclose(haversine_to_many(31.62, 74.87, lats, lons), expected)
+    # equirectangular is an approximation; sub-kilometre error stays under a centimetre
+    assert np.allclose(equirect_to_many(31.62, 74.87, lats, lons), expected, atol=0.01)
+
+
+def test_pairwise_and_mask_shapes():
+    a = pairwise_distances([0.0, 1.0], [0.0, 1.0], [0.0, 0.0, 1.0], [0.0, 1.0, 1.0])
+    assert a.shape == (2, 3)
+    assert a[0, 0] == 0.0 and a[1, 2] == 0.0
+    mask = within_radius(0.0, 0.0, [0.0, 0.00005, 0.01], [0.0, 0.0, 0.0], 10)
+    assert mask.tolist() == [True, True, False]
+
+
+def test_scalar_distance_matches_vector_kernel():
+    lats = [31.62, 31.6205, 31.63]
+    lons = [74.87, 74.8702, 74.9]
+    for radius in (10, 5000):
+        expected = distances_to_many(31.62, 74.87, lats, lons, radius)
+        assert np.allclose([distance_meters(31.62, 74.87, a, b, radius) for a, b in zip(lats, lons)], expected)
@@ -0,0 +1,75 @@
+import json
+import pickle
+
+import pytest
+
+from backen.schemas import EventModel, ScenarioModel
+from backen.utils.attack_scenarios import generate_relay_attack
+from backen.utils.ingest import IngestError, ScenarioColumns, loads
+from backen.utils.result_cache import cache_key
+from backen.utils.rule_engine import evaluate_scenario
+
+RULE = {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 600, "coords_radius_meters": 10}
+
+
+def test_columns_match_pydantic_models():
+    payload = loads(generate_relay_attack().json())
+    payload["event_sequence"][0].update(entity_id=7, timestamp_offset_seconds="3", coords=[31, 74])
+    columns = ScenarioColumns.parse(payload)
+    model = ScenarioModel.parse_obj(payload)
+    assert columns.events.records() == [ev.dict() for ev in model.event_sequence]
+    assert columns.events.times.tolist() == [ev.timestamp_offset_seconds for ev in model.event_sequence]
+    assert columns.events.lat.tolist() == [ev.coords[0] for ev in model.event_sequence]
+    assert cache_key(columns.event_sequence, RULE) == cache_key(model.event_sequence, RULE)
+
+
+def test_engine_gives_same_result_for_columns_and_models():
+    model = generate_relay_attack()
+    columns = ScenarioColumns.from_model(model)
+    for rule in (RULE, {"type": "loiter", "params": {"radius_m": 50, "min_duration_s": 30}}):
+        a = evaluate_scenario(model, rule)
+        b = evaluate_scenario(pickle.loads(pickle.dumps(columns)), rule)
+        assert a.detected == b.detected
+        assert [x["evidence"] for x in a.alerts] == [x["evidence"] for x in b.alerts]
+        assert a.event_sequence == b.event_sequence
+
+
+@pytest.mark.parametrize("payload, field", [
+    ({"event_sequence": []}, "scenario_id"),
+    ({"scenario_id": "s", "event_sequence": {}}, "event_sequence"),
+    ({"scenario_id": "s", "event_sequence": [{"entity_id": "a", "action": "m", "coords": [0, 0]}]}, "event_sequence[0].timestamp_offset_seconds"),
+    ({"scenario_id": "s", "event_sequence": [{"entity_id": "a", "action": "m", "timestamp_offset_seconds": 0, "coords": [0]}]}, "event_sequence[0].coords"),
+    ({"scenario_id": "s", "event_sequence": [{"entity_id": None, "action": "m", "timestamp_offset_seconds": 0, "coords": [0, 0]}]}, "event_sequence[0].entity_id"),
+    ({"scenario_id": "s", "event_sequence": [{"entity_id": "a", "action": "m", "timestamp_offset_seconds": 0, "coords": [0, 0], "metadata": []}]}, "event_sequence[0].metadata"),
+])
+def test_parse_names_the_invalid_field(payload, field):
+    with pytest.raises(IngestError) as exc:
+        ScenarioColumns.parse(payload)
+    assert str(exc.value).startswith(field + ":")
+
+
+def test_to_model_builds_models_without_revalidating():
+    model = generate_relay_attack()
+    rebuilt = ScenarioColumns.from_model(model).to_model(ScenarioModel, EventModel)
+    assert rebuilt == model
+
+
+def test_stdlib_decoder_fallback(monkeypatch):
+    from backen.utils import ingest
+
+    monkeypatch.setattr(ingest, "orjson", None)
+    body = generate_relay_attack().json()
+    columns = ScenarioColumns.parse(loads(body.encode()))
+    assert len(columns.events.entity_id) == len(json.loads(body)["event_sequence"])
+    with pytest.raises(ValueError):
+        loads(b"{not json")
+
+
+@pytest.mark.parametrize("offset", ["1e999", "Infinity", "-Infinity", "NaN"])
+def test_non_finite_offsets_are_ingest_errors(monkeypatch, offset):
+    from backen.utils import ingest
+
+    monkeypatch.setattr(ingest, "orjson", None)
+    body = '{"scenario_id": "s", "event_sequence": [{"entity_id": "a", "action": "drop", "timestamp_offset_seconds": %s, "coords": [1, 2]}]}' % offset
+    with pytest.raises(IngestError, match="timestamp_offset_seconds"):
+        ScenarioColumns.parse(loads(body))
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import random
+
+from backen.utils.attack_scenarios import generate_relay_attack
+from backen.utils.json_stream import EventSequenceParser, scenario_messages
+
+
+def _chunks(text, rng):
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 9)
+        yield text[i:i + n]
+        i += n
+
+
+def test_parser_emits_events_across_arbitrary_chunk_boundaries():
+    scenario = json.loads(generate_relay_attack().json())
+    scenario["event_sequence"][0]["metadata"] = {"note": 'a "quoted" {brace} [x] \\ back', "event_sequence": [{"x": 1}]}
+    payload = {"description": 'mentions "event_sequence": [ too', "scenario_id": "s", "event_sequence": scenario["event_sequence"], "tail": [{"a": 1}]}
+    text = "```json\n" + json.dumps(payload, indent=1) + "\n```"
+    rng = random.Random(0)
+    for _ in range(50):
+        parser = EventSequenceParser()
+        events = [ev for chunk in _chunks(text, rng) for ev in parser.feed(chunk)]
+        assert events == payload["event_sequence"]
+        assert parser.finish() == payload
+
+
+def test_first_event_is_available_before_the_body_completes():
+    parser = EventSequenceParser()
+    assert parser.feed('{"scenario_id": "s", "event_sequence": [{"entity_id": "a", "action": "drop", ') == []
+    assert parser.feed('"timestamp_offset_seconds": 0, "coords": [1, 2]}, {"entity_id"') == [
+        {"entity_id": "a", "action": "drop", "timestamp_offset_seconds": 0, "coords": [1, 2]}
+    ]
+
+
+def test_parser_keeps_only_the_unfinished_event_buffered():
+    events = [{"entity_id": f"e{i}", "action": "move", "timestamp_offset_seconds": i, "coords": [1, 2]} for i in range(2000)]
+    text = json.dumps({"description": "x" * 100, "event_sequence": events})
+    parser = EventSequenceParser()
+    longest = 0
+    out = []
+    for chunk in _chunks(text, random.Random(1)):
+        out.extend(parser.feed(chunk))
+        longest = max(longest, len(parser._buf))
+    assert out == events
+    assert longest < 2 * len(json.dumps(events[-1])) + 10
+    assert parser.finish()["event_sequence"] == events
+
+
+def _collect(chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [m async for m in scenario_messages(source(), generate_relay_attack)]
+
+    return asyncio.run(run())
+
+
+def test_messages_skip_invalid_events_and_fall_back_without_ai_output():
+    body = json.dumps({"scenario_id": "ai_1", "event_sequence": [
+        {"entity_id": "a", "action": "drop", "timestamp_offset_seconds": 0, "coords": [1, 2]},
+        {"entity_id": "b", "action": "pickup", "coords": [1, 2]},
+    ]})
+    messages = _collect([body[:40], body[40:]])
+    assert [m["type"] for m in messages] == ["event", "invalid_event", "scenario"]
+    assert messages[1]["detail"].startswith("event_sequence[1].timestamp_offset_seconds")
+    assert messages[-1] == {"type": "scenario", "source": "ai", "scenario_id": "ai_1", "description": None, "event_count": 1}
+
+    fallback = _collect(["Sorry, I can't help with that."])
+    assert fallback[-1]["source"] == "fallback"
+    assert fallback[-1]["event_count"] == len(fallback) - 1 > 0
@@ -0,0 +1,17 @@
+from sqlalchemy import create_engine, inspect, text
+
+from backen.migrations import MIGRATIONS, run_migrations, add_column_if_missing
+
+
+def test_migrations_apply_once_in_order(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}")
+    calls = []
+    steps = MIGRATIONS + [
+        (90, "add note column", lambda conn: (calls.append(90), add_column_if_missing(conn, "rules", "note", "VARCHAR"))),
+    ]
+    assert run_migrations(engine, steps) == 90
+    assert run_migrations(engine, steps) == 90
+    assert calls == [90]
+    assert "note" in {c["name"] for c in inspect(engine).get_columns("rules")}
+    with engine.connect() as conn:
+        assert [r[0] for r in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))] == [m[0] for m in MIGRATIONS] + [90]
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from backen.utils.prompt_cache import PromptCache, cache_bypassed, prompt_key
+
+
+def test_prompt_key_covers_endpoint_prompt_tokens_and_streaming():
+    key = prompt_key("http://a", "p", 512)
+    assert key == prompt_key("http://a", "p", 512)
+    assert len({key, prompt_key("http://b", "p", 512), prompt_key("http://a", "q", 512), prompt_key("http://a", "p", 256), prompt_key("http://a", "p", 512, stream=True)}) == 5
+    assert cache_bypassed({"X-AI-Cache": "Bypass"}) and not cache_bypassed({})
+
+
+def test_lru_evicts_oldest_and_expires_after_ttl():
+    async def scenario():
+        cache = PromptCache(maxsize=2, ttl=0.05)
+        await cache.put("a", {"v": 1})
+        await cache.put("b", {"v": 2})
+        assert await cache.get("a") == {"v": 1}
+        await cache.put("c", {"v": 3})
+        assert await cache.get("b") is None
+        time.sleep(0.06)
+        assert await cache.get("a") is None
+        return cache.hits, cache.misses
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_persistent_tier_is_shared_and_honours_ttl(tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from backen.migrations import upgrade
+    from backen.models import AIGeneratedScenario
+
+    url = f"sqlite:///{tmp_path / 'ai.db'}"
+    upgrade(create_engine(url))
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    factory = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def scenario():
+        await PromptCache(AIGeneratedScenario, factory).put("k", {"parsed": {"scenario_id": "s1"}, "raw": "{}"})
+        # a fresh process-level cache (another worker) reads it back from the table
+        other = await PromptCache(AIGeneratedScenario, factory).get("k")
+        await PromptCache(AIGeneratedScenario, factory).put("k", {"parsed": {"scenario_id": "s2"}, "raw": "{}"})
+        refreshed = await PromptCache(AIGeneratedScenario, factory).get("k")
+        expired = await PromptCache(AIGeneratedScenario, factory, ttl=0).get("k")
+        await async_engine.dispose()
+        return other, refreshed, expired
+
+    other, refreshed, expired = asyncio.run(scenario())
+    assert other["parsed"]["scenario_id"] == "s1"
+    assert refreshed["parsed"]["scenario_id"] == "s2"
+    assert expired is None
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backen.utils.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay, parse_retry_after
+
+
+def test_token_bucket_allows_burst_then_paces_to_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=3)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # 3 from the burst, 3 more at 50/s
+    assert 0.05 <= asyncio.run(scenario()) < 0.5
+
+
+def test_retry_after_and_jittered_backoff():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+    assert 15 < parse_retry_after(later) <= 20
+    assert backoff_delay(5, base=0.5, cap=30, retry_after=2.0) == 2.0
+    assert backoff_delay(5, base=0.5, cap=30, retry_after=120) == 30
+    assert all(0 <= backoff_delay(3, base=0.5, cap=2) <= 2 for _ in range(100))
+
+
+def test_circuit_breaker_opens_fails_fast_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, reset_after=10)
+    breaker.check()
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    now[0] += 10
+    breaker.check()  # the single half-open trial
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] += 10
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -0,0 +1,92 @@
+from backen.utils.attack_scenarios import generate_relay_attack
+from backen.utils import result_cache
+from backen.utils.result_cache import ResultCache, cache_key, scenario_hash
+
+
+def test_scenario_hash_ignores_ids_only_when_asked():
+    a = generate_relay_attack()
+    b = a.copy(deep=True)
+    b.scenario_id = "other"
+    assert scenario_hash(a.event_sequence) == scenario_hash(b.event_sequence)
+
+    for ev in b.event_sequence:
+        ev.entity_id = ev.entity_id + "_x"
+    assert scenario_hash(a.event_sequence) != scenario_hash(b.event_sequence)
+    assert scenario_hash(a.event_sequence, ignore_ids=True) == scenario_hash(b.event_sequence, ignore_ids=True)
+
+
+def test_cache_key_changes_with_rule():
+    events = generate_relay_attack().event_sequence
+    assert cache_key(events, {"radius_m": 50}) != cache_key(events, {"radius_m": 60})
+    assert cache_key(events, {"a": 1, "b": 2}) == cache_key(events, {"b": 2, "a": 1})
+
+
+def test_cache_key_changes_with_engine_version(monkeypatch):
+    events = generate_relay_attack().event_sequence
+    before = cache_key(events, None)
+    monkeypatch.setattr(result_cache, "ENGINE_VERSION", result_cache.ENGINE_VERSION + 1)
+    assert cache_key(events, None) != before
+
+
+def test_lru_evicts_oldest_and_counts_hits():
+    cache = ResultCache(maxsize=2)
+    cache.put(None, "a", {"v": 1})
+    cache.put(None, "b", {"v": 2})
+    assert cache.get(None, "a") == {"v": 1}
+    cache.put(None, "c", {"v": 3})
+    assert cache.get(None, "b") is None
+    assert cache.get_many(None, ["a", "c"]) == {"a": {"v": 1}, "c": {"v": 3}}
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_persistent_tier_survives_process_cache(tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backen.migrations import upgrade
+    from backen.models import CachedResult
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    upgrade(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        cache = ResultCache(CachedResult, persist=True)
+        cache.put_many(db, {"k1": {"detected": True}, "k2": {"detected": False}})
+        cache.put(db, "k1", {"detected": True})
+        db.commit()
+        assert db.query(CachedResult).count() == 2
+
+        fresh = ResultCache(CachedResult, persist=True)
+        assert fresh.get_many(db, ["k1", "k2", "k3"]) == {"k1": {"detected": True}, "k2": {"detected": False}}
+    finally:
+        db.close()
+
+
+def test_table_drops_expired_rows_and_keeps_newest_within_cap(tmp_path):
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine, update
+    from sqlalchemy.orm import sessionmaker
+    from backen.migrations import upgrade
+    from backen.models import CachedResult
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    upgrade(engine)
+    db = sessionmaker(bind=engine)()
+
+    def age(key, minutes):
+        db.execute(update(CachedResult).where(CachedResult.key == key).values(created_at=datetime.utcnow() - timedelta(minutes=minutes)))
+
+    try:
+        cache = ResultCache(CachedResult, persist=True, ttl=3600, max_rows=2)
+        cache.put_many(db, {"old": {"v": 0}, "a": {"v": 1}})
+        age("old", 120)
+        age("a", 30)
+        cache.clear()
+        assert cache.get_many(db, ["old", "a"]) == {"a": {"v": 1}}
+
+        cache.put(db, "b", {"v": 2})
+        age("b", 20)
+        cache.put(db, "c", {"v": 3})
+        db.commit()
+        assert sorted(k for (k,) in db.query(CachedResult.key)) == ["b", "c"]
+    finally:
+        db.close()
@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backen.models import Base, Rule, RuleState
+from backen.utils.rule_cache import ActiveRuleCache
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def test_cache_reloads_only_after_version_bump():
+    Session = _session()
+    writer, reader = Session(), Session()
+    cache = ActiveRuleCache(Rule, RuleState)
+    other_worker = ActiveRuleCache(Rule, RuleState)
+
+    assert cache.get(reader) is None
+    writer.add(Rule(rule_id="loiter_v1", rule_json={"type": "loiter"}, active=True))
+    other_worker.bump(writer)
+    writer.commit()
+
+    first = cache.get(reader)
+    assert first.rule_id == "loiter_v1" and first.version == 1
+    assert cache.get(reader) is first
+
+    writer.query(Rule).update({Rule.active: False})
+    writer.add(Rule(rule_id="stateful_handoff_v2", rule_json={"rule_id": "stateful_handoff_v2"}, active=True))
+    other_worker.bump(writer)
+    writer.commit()
+    assert cache.get(reader).rule_id == "stateful_handoff_v2"
+
+
+def test_first_bumps_from_concurrent_workers_do_not_collide(tmp_path):
+    import threading
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'rules.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    errors = []
+    start = threading.Barrier(4)
+
+    def worker():
+        db = Session()
+        try:
+            start.wait()
+            ActiveRuleCache(Rule, RuleState).bump(db)
+            db.commit()
+        except Exception as e:  # collected for the assertion below
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert ActiveRuleCache(Rule, RuleState).current_version(Session()) == 4
@@ -0,0 +1,59 @@
+import pytest
+
+from backen.utils.rule_compiler import RuleCompileError, compile_rule, get_compiled_rule, register_detector, _DETECTORS
+from backen.utils.rule_engine import StreamingEvaluator
+
+
+def test_compile_parses_parameters_once():
+    rule = compile_rule({"rule_id": "stateful_handoff_v2", "temporal_window_seconds": "120", "coords_radius_meters": 5})
+    (spec,) = rule.specs
+    assert spec.temporal == 120
+    assert [(step.action, step.radius) for step in spec.steps] == [("drop", 5.0), ("pickup", 5.0)]
+    assert [s.loiter_sec for s in compile_rule({"type": "loiter"}).specs] == [60]
+    assert compile_rule({}).specs == ()
+
+
+@pytest.mark.parametrize("rule_json", [
+    {"type": "loiter", "loiter_time_seconds": "soon"},
+    {"type": "loiter", "loiter_time_seconds": -1},
+    {"rule_id": "stateful_handoff_v2", "coords_radius_meters": 0},
+    {"required_event_sequence": "drop,pickup"},
+    ["not", "an", "object"],
+])
+def test_compile_rejects_malformed_rules(rule_json):
+    with pytest.raises(RuleCompileError):
+        compile_rule(rule_json)
+
+
+def test_compiled_rule_is_cached_by_content_and_shared_by_evaluators():
+    a = get_compiled_rule({"type": "loiter", "loiter_time_seconds": 30})
+    assert get_compiled_rule({"loiter_time_seconds": 30, "type": "loiter"}) is a
+    assert StreamingEvaluator({"type": "loiter", "loiter_time_seconds": 30}).rule is a
+    assert StreamingEvaluator(a).rule is a
+
+
+def test_register_detector_extends_the_engine():
+    class EveryEvent:
+        def push(self, e):
+            return [{"alert_id": "x", "rule_triggered": "every_event", "level": "low", "evidence": [e["entity_id"]]}]
+
+    class EverySpec:
+        def matcher(self):
+            return EveryEvent()
+
+    fn = register_detector(lambda rule_json: EverySpec() if rule_json.get("type") == "every_event" else None)
+    try:
+        ev = StreamingEvaluator({"type": "every_event"})
+        assert ev.push({"entity_id": "A", "timestamp_offset_seconds": 0, "coords": [0, 0]})[0]["evidence"] == ["A"]
+        assert ev.detected
+    finally:
+        _DETECTORS.remove(fn)
+
+
+def test_loiter_parameters_from_params_block():
+    (spec,) = compile_rule({"type": "loiter", "params": {"radius_m": 20, "min_duration_s": 90}}).specs
+    assert (spec.loiter_sec, spec.radius, spec.center) == (90, 20, None)
+    (spec,) = compile_rule({"type": "loiter", "radius_m": 5, "zone_center": [1, 2]}).specs
+    assert (spec.loiter_sec, spec.radius, spec.center) == (60, 5, (1.0, 2.0))
+    with pytest.raises(RuleCompileError):
+        compile_rule({"type": "loiter", "params": {"center": [1, 2]}})
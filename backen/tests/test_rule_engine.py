@@ -1,4 +1,6 @@
-from backen.utils.rule_engine import evaluate_scenario
+from datetime import datetime
+
+from backen.utils.rule_engine import evaluate_scenario, StreamingEvaluator, anchor_alerts
 
 
 def test_loiter_detects_long_loiter():
@@ -28,3 +30,97 @@ def test_loiter_detects_long_loiter():
 
     result = evaluate_scenario(scenario, rule)
     assert result.detected is True
+
+
+def _handoff_events():
+    return [
+        {"entity_id": "DRONE_1", "action": "enter", "timestamp_offset_seconds": 0, "coords": [31.62, 74.87]},
+        {"entity_id": "DRONE_1", "action": "drop", "timestamp_offset_seconds": 45, "coords": [31.62012, 74.87009]},
+        {"entity_id": "PERSON_1", "action": "pickup", "timestamp_offset_seconds": 230, "coords": [31.62013, 74.8701]},
+    ]
+
+
+def test_streaming_evaluator_fires_on_pickup():
+    rule = {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 600, "coords_radius_meters": 10, "required_event_sequence": ["drop", "pickup"]}
+    ev = StreamingEvaluator(rule)
+    events = _handoff_events()
+    assert ev.push(events[0]) == []
+    assert ev.push(events[1]) == []
+    fired = ev.push(events[2])
+    assert len(fired) == 1
+    assert fired[0]["rule_triggered"] == "stateful_handoff_v2"
+    assert ev.detected is True
+
+
+def test_epoch_anchors_evidence_timestamps_only_on_output():
+    rule = {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 600, "coords_radius_meters": 10, "required_event_sequence": ["drop", "pickup"]}
+    epoch = datetime(2024, 1, 1, 12, 0, 0)
+    offsets = StreamingEvaluator(rule).push_many(_handoff_events())
+    anchored = StreamingEvaluator(rule, epoch=epoch).push_many(_handoff_events())
+    evidence = anchored[0]["evidence"][0]
+    assert evidence["drop"]["drop_ts"] == datetime(2024, 1, 1, 12, 0, 45)
+    assert evidence["pickup"]["timestamp"] == datetime(2024, 1, 1, 12, 3, 50)
+    assert evidence["pickup"]["coords"] == [31.62013, 74.8701]
+    assert offsets[0]["evidence"][0]["drop"]["drop_ts"] == 45
+    assert anchor_alerts(offsets, epoch)[0]["evidence"] == [evidence]
+
+
+def test_streaming_evaluator_expires_drops_outside_window():
+    rule = {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 60, "coords_radius_meters": 10}
+    ev = StreamingEvaluator(rule)
+    assert ev.push_many(_handoff_events()) == []
+    assert ev._matchers[0].pending == 0
+
+
+def test_multi_step_sequence_respects_order_gaps_and_distance():
+    rule = {
+        "rule_id": "relay_v3",
+        "temporal_window_seconds": 600,
+        "coords_radius_meters": 20,
+        "required_event_sequence": ["approach", "drop", {"action": "pickup", "within_seconds": 120}],
+    }
+    near, far = [31.62, 74.87], [31.63, 74.88]
+
+    def ev(action, t, coords=near):
+        return {"entity_id": "X", "action": action, "timestamp_offset_seconds": t, "coords": coords}
+
+    # out of order: drop before approach never completes
+    assert StreamingEvaluator(rule).push_many([ev("drop", 0), ev("approach", 10), ev("pickup", 20)]) == []
+    # intermediate step too far from the previous one
+    assert StreamingEvaluator(rule).push_many([ev("approach", 0), ev("drop", 10, far), ev("pickup", 20, far)]) == []
+    # pickup outside the per-step gap
+    assert StreamingEvaluator(rule).push_many([ev("approach", 0), ev("drop", 10), ev("pickup", 200)]) == []
+
+    fired = StreamingEvaluator(rule).push_many([ev("approach", 0), ev("move", 5), ev("drop", 10), ev("drop", 30), ev("pickup", 60), ev("pickup", 70)])
+    assert len(fired) == 1
+    evidence = fired[0]["evidence"][0]
+    assert set(evidence) == {"approach", "drop", "pickup"}
+    assert fired[0]["rule_triggered"] == "relay_v3"
+
+
+def _walk(step_deg, n=10, dt=15):
+    # one sample every dt seconds, moving step_deg of latitude each time
+    return [{"entity_id": "PERSON_A", "timestamp": i * dt, "latitude": 37.0 + i * step_deg, "longitude": -122.0} for i in range(n)]
+
+
+def test_loiter_radius_ignores_entities_passing_through():
+    rule = {"type": "loiter", "params": {"radius_m": 20, "min_duration_s": 60}}
+    # ~11 m per sample leaves a 20 m anchor radius every other sample
+    assert evaluate_scenario({"event_sequence": _walk(0.0001)}, rule).detected is False
+    # ~1 m per sample stays well inside
+    result = evaluate_scenario({"event_sequence": _walk(0.00001)}, rule)
+    assert result.detected is True
+    assert result.alerts[0]["evidence"][0]["anchor"] == [37.0, -122.0]
+    # streaming gives the same answer
+    assert StreamingEvaluator(rule).push_many(_walk(0.0001)) == []
+
+
+def test_loiter_zone_accumulates_time_inside_centre_radius():
+    rule = {"type": "loiter", "params": {"radius_m": 30, "min_duration_s": 60, "center": [37.0, -122.0]}}
+    inside = {"latitude": 37.0, "longitude": -122.0}
+    outside = {"latitude": 37.01, "longitude": -122.0}
+    events = [dict(p, entity_id="A", timestamp=t) for t, p in [(0, inside), (40, inside), (50, outside), (60, inside), (90, inside)]]
+    # 40 s + 30 s inside, interrupted by an excursion
+    (alert,) = evaluate_scenario({"event_sequence": events}, rule).alerts
+    assert alert["evidence"][0]["duration"] == 70
+    assert len(StreamingEvaluator(rule).push_many(events)) == 1
@@ -0,0 +1,204 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backen.main import app
+from backen.utils.attack_scenarios import generate_relay_attack
+
+
+def _without_ids(result):
+    return dict(result, run_id=None, alerts=[dict(a, alert_id=None) for a in result["alerts"]])
+
+
+@pytest.fixture(scope="module")
+def client():
+    # entering the client runs the startup migrations
+    with TestClient(app) as c:
+        yield c
+
+
+def test_run_batch_accepts_array_and_ndjson(client):
+    scenarios = [json.loads(generate_relay_attack().json()) for _ in range(3)]
+    r = client.post("/simulate/run_batch", json=scenarios)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 3
+    assert all(res["run_id"] for res in body["results"])
+
+    ndjson = "\n".join(json.dumps(s) for s in scenarios)
+    r = client.post("/simulate/run_batch", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200
+    assert r.json()["count"] == 3
+
+
+def test_run_batch_rejects_invalid_item(client):
+    r = client.post("/simulate/run_batch", json=[{"scenario_id": "x"}])
+    assert r.status_code == 400
+    assert "index 0" in r.json()["detail"]
+
+
+def test_run_persists_run_and_events_in_one_transaction(client):
+    from backen.database import SessionLocal
+    from backen.models import EventLog, SimulationRun
+
+    r = client.post("/simulate/run", json={})
+    assert r.status_code == 200
+    run_id = r.json()["run_id"]
+    db = SessionLocal()
+    try:
+        assert db.query(SimulationRun).filter(SimulationRun.run_id == run_id).count() == 1
+        assert db.query(EventLog).filter(EventLog.run_id == run_id).count() == len(r.json()["event_sequence"])
+    finally:
+        db.close()
+
+
+def test_logs_keyset_pagination_and_summary_fields(client):
+    for _ in range(5):
+        client.post("/simulate/run", json={})
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "summary"}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/simulate/logs", params=params).json()
+        seen.extend(r["run_id"] for r in body["runs"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) >= 5
+    row = client.get("/simulate/logs", params={"limit": 1, "fields": "summary"}).json()["runs"][0]
+    assert set(row) == {"run_id", "rule_id", "created_at", "detected", "alert_count", "event_count"}
+    assert isinstance(row["detected"], bool)
+    assert client.get("/simulate/logs", params={"fields": "bogus"}).status_code == 400
+    assert client.get("/simulate/logs", params={"cursor": "!!"}).status_code == 400
+
+
+def test_metrics_aggregates_per_rule_in_sql(client):
+    client.post("/simulate/run", json={})
+    body = client.get("/simulate/metrics", params={"window_hours": 24}).json()
+    by_rule = {r["rule_id"]: r for r in body["rules"]}
+    assert by_rule
+    for row in by_rule.values():
+        assert row["runs"] == row["detected"] + row["bypassed"]
+        assert row["events"] > 0
+        assert row["bypassed_events"] == 0
+        assert row["avg_duration_ms"] is not None
+
+
+def test_run_reuses_cached_result_unless_bypassed(client):
+    from backen.routes.simulation import result_cache
+
+    scenario = json.loads(generate_relay_attack().json())
+    first = client.post("/simulate/run", json=scenario).json()
+    hits = result_cache.hits
+    second = client.post("/simulate/run", json=scenario).json()
+    assert result_cache.hits == hits + 1
+    assert second["run_id"] != first["run_id"]
+    assert _without_ids(second) == _without_ids(first)
+    # cache hits store no duration, so they don't drag avg_duration_ms down
+    rows = client.get("/simulate/logs", params={"limit": 2, "fields": "run_id,duration_ms"}).json()["runs"]
+    durations = {r["run_id"]: r["duration_ms"] for r in rows}
+    assert durations[second["run_id"]] is None and durations[first["run_id"]] is not None
+
+    client.post("/simulate/run", params={"use_cache": "false"}, json=scenario)
+    assert result_cache.hits == hits + 1
+
+    body = client.post("/simulate/run_batch", json=[scenario, scenario]).json()
+    assert result_cache.hits == hits + 3
+    assert [r["detected"] for r in body["results"]] == [first["detected"]] * 2
+
+    # every run, cached or not, gets its own alert IDs
+    alert_ids = [a["alert_id"] for r in [first, second] + body["results"] for a in r["alerts"]]
+    assert len(alert_ids) == len(set(alert_ids)) == 4 * len(first["alerts"]) > 0
+
+
+def test_cache_hit_across_ids_returns_the_requested_events(client, monkeypatch):
+    from backen.routes import simulation
+    from backen.utils.result_cache import rule_hash, scenario_hash
+
+    monkeypatch.setattr(simulation, "cache_key", lambda events, rule_json: f"ids:{scenario_hash(events, ignore_ids=True)}:{rule_hash(rule_json)}")
+    scenario = json.loads(generate_relay_attack().json())
+    client.post("/simulate/run", json=scenario)
+    for ev in scenario["event_sequence"]:
+        ev["entity_id"] += "_renamed"
+    hits = simulation.result_cache.hits
+    body = client.post("/simulate/run", json=scenario).json()
+    assert simulation.result_cache.hits == hits + 1
+    assert [ev["entity_id"] for ev in body["event_sequence"]] == [ev["entity_id"] for ev in scenario["event_sequence"]]
+
+
+def test_apply_patch_rejects_uncompilable_rule(client):
+    r = client.post("/simulate/apply_patch", json={"patch_json": {"rule_id": "stateful_handoff_v2", "coords_radius_meters": "near"}})
+    assert r.status_code == 400
+    assert "coords_radius_meters" in r.json()["detail"]
+
+
+def test_fast_json_responses_match_default_encoding(client, monkeypatch):
+    from backen.utils import responses
+
+    scenario = json.loads(generate_relay_attack().json())
+    slow = client.post("/simulate/run", json=scenario).json()
+    monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", True)
+    fast = client.post("/simulate/run", json=scenario)
+    assert fast.headers["content-type"] == "application/json"
+    assert _without_ids(fast.json()) == _without_ids(slow)
+
+    r = client.post("/simulate/run_batch", json=[scenario, scenario])
+    assert [_without_ids(res) for res in r.json()["results"]] == [_without_ids(slow)] * 2
+    assert client.get("/simulate/logs", params={"limit": 1}).json()["count"] == 1
+
+
+def test_concurrent_runs_evaluate_off_the_event_loop(client, monkeypatch):
+    import asyncio
+
+    import httpx
+
+    from backen.database import get_async_db
+    from backen.utils import parallel
+
+    # force the process-pool path even for small generated scenarios
+    monkeypatch.setattr(parallel, "PROCESS_MIN_SIZE", 0)
+    open_sessions = []
+
+    async def tracked_db():
+        async for session in get_async_db():
+            open_sessions.append(session)
+            yield session
+            open_sessions.remove(session)
+
+    app.dependency_overrides[get_async_db] = tracked_db
+    scenarios = [json.loads(generate_relay_attack().json()) for _ in range(4)]
+
+    async def run_all():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.post("/simulate/run", json=s) for s in scenarios))
+
+    try:
+        # on the client's own loop, where the async engine's pooled connections live
+        responses = client.portal.call(run_all)
+    finally:
+        app.dependency_overrides.pop(get_async_db)
+    assert [r.status_code for r in responses] == [200] * len(scenarios)
+    assert len({r.json()["run_id"] for r in responses}) == len(scenarios)
+    assert open_sessions == []
+
+
+def test_shutdown_stops_process_pool():
+    from backen.utils import parallel
+
+    with TestClient(app):
+        parallel.get_process_pool()
+        assert parallel._pool is not None
+    assert parallel._pool is None
+
+
+def test_fast_json_responses_without_orjson(client, monkeypatch):
+    from backen.utils import responses
+
+    scenario = json.loads(generate_relay_attack().json())
+    slow = client.post("/simulate/run", json=scenario).json()
+    monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", True)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert _without_ids(client.post("/simulate/run", json=scenario).json()) == _without_ids(slow)
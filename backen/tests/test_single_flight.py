@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from backen.utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call_and_its_errors():
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if value == "bad":
+            raise RuntimeError("upstream failed")
+        return {"value": value}
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.run("k", lambda: fetch("ok")) for _ in range(5)])
+        errors = await asyncio.gather(*[flight.run("e", lambda: fetch("bad")) for _ in range(3)], return_exceptions=True)
+        # a finished call is not reused
+        again = await flight.run("k", lambda: fetch("ok"))
+        return flight, results, errors, again
+
+    flight, results, errors, again = asyncio.run(scenario())
+    assert calls == ["ok", "bad", "ok"]
+    assert all(r is results[0] for r in results) and again == results[0]
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert (flight.started, flight.joined, len(flight)) == (3, 6, 0)
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run("k", fetch))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.run("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
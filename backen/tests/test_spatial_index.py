@@ -0,0 +1,30 @@
+import random
+
+from backen.utils.geodesy import haversine_meters as _haversine_meters
+from backen.utils.spatial_index import GridIndex
+
+
+def test_nearby_returns_every_point_within_radius():
+    random.seed(7)
+    for center_lat in (0.0, 31.62, 78.0):
+        idx = GridIndex(25)
+        pts = {}
+        for i in range(500):
+            lat = center_lat + random.uniform(-0.002, 0.002)
+            lon = 74.87 + random.uniform(-0.002, 0.002)
+            idx.insert(i, lat, lon)
+            pts[i] = (lat, lon)
+        q = (center_lat, 74.87)
+        expected = {k for k, p in pts.items() if _haversine_meters(list(q), list(p)) <= 25}
+        found = {k for k, _, _, _ in idx.nearby(*q)}
+        assert expected <= found
+
+
+def test_remove_and_antimeridian_wrap():
+    idx = GridIndex(50)
+    idx.insert("a", 10.0, 179.9999)
+    found = {k for k, _, _, _ in idx.nearby(10.0, -179.9999)}
+    assert "a" in found
+    assert idx.remove("a") is True
+    assert idx.remove("a") is False
+    assert len(idx) == 0
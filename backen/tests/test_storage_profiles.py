@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+from backen.storage_profiles import engine_options, install_pragmas, get_profile
+
+
+def test_wal_profile_sets_pragmas_and_pool(tmp_path):
+    url = f"sqlite:///{tmp_path / 'p.db'}"
+    engine = create_engine(url, **engine_options(url, profile="wal"))
+    install_pragmas(engine, url, profile="wal")
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_async_engine_gets_pragmas(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'a.db'}"
+    engine = create_async_engine(url, **engine_options(url, is_async=True, profile="wal"))
+    install_pragmas(engine.sync_engine, url, profile="wal")
+
+    async def check():
+        async with engine.connect() as conn:
+            return (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+
+    assert asyncio.run(check()) == "wal"
+
+
+def test_legacy_profile_and_unknown_name():
+    assert engine_options("sqlite:///x.db", profile="legacy") == {"connect_args": {"check_same_thread": False}}
+    with pytest.raises(ValueError):
+        get_profile("nope")
@@ -0,0 +1,32 @@
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from backen.utils.sweep import build_grid, run_sweep
+
+
+def test_sweep_reports_rates_per_cell():
+    grid = build_grid([45], [120, 1200], [0.0])
+    rule = {"rule_id": "stateful_handoff_v2", "temporal_window_seconds": 600, "coords_radius_meters": 10}
+    with ThreadPoolExecutor(2) as pool:
+        report = run_sweep(rule, grid, variants_per_cell=5, executor=pool)
+    fast, slow = report["cells"]
+    assert fast["detection_rate"] == 1.0
+    # pickup long after the temporal window bypasses the rule
+    assert slow["bypass_rate"] == 1.0
+    assert report["variants"] == 10
+    assert report["detected"] == 5
+
+
+def test_sweep_cli_rejects_ranges_that_never_advance(capsys):
+    spec = importlib.util.spec_from_file_location("sweep_cli", Path(__file__).resolve().parents[1] / "scripts" / "sweep.py")
+    cli = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cli)
+    assert cli._parse_values("30:60:15", int) == [30, 45, 60]
+    assert cli._parse_values("0.1,0.2", float) == [0.1, 0.2]
+    for args in (["--drop-delays", "30:90:0"], ["--pickup-delays", "10:20:-5"], ["--drop-delays", "0:10:0.5"], ["--noise", "1e20:2e20:1"]):
+        with pytest.raises(SystemExit):
+            cli.main(args)
+        assert "error: argument" in capsys.readouterr().err
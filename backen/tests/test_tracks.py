@@ -0,0 +1,63 @@
+import numpy as np
+
+from backen.utils.rule_engine import StreamingEvaluator, evaluate_events
+from backen.utils.tracks import TrackStore
+
+
+def _events():
+    return [
+        {"entity_id": "A", "timestamp": 30, "coords": [0.0, 0.001]},
+        {"entity_id": "B", "timestamp": 5, "coords": None},
+        {"entity_id": "A", "timestamp": 0, "coords": [0.0, 0.0]},
+        {"entity_id": "A", "timestamp": 20, "coords": [0.0, 0.0005]},
+        {"entity_id": "A", "timestamp": 20, "coords": [0.0, 0.0006]},
+    ]
+
+
+def test_tracks_are_grouped_and_sorted_by_time():
+    store = TrackStore.from_events(_events())
+    assert store.entities == ["A", "B"]
+    a = store["A"]
+    assert a.t.dtype == np.int64 and a.lat.dtype == np.float64
+    assert a.t.tolist() == [0, 20, 20, 30]
+    # stable: equal timestamps keep input order
+    assert a.index.tolist() == [2, 3, 4, 0]
+    assert (a.first, a.last, a.dwell) == (0, 30, 30)
+    assert np.isnan(store["B"].lat[0])
+
+
+def test_track_speeds():
+    a = TrackStore.from_events(_events())["A"]
+    speeds = a.speeds()
+    assert len(speeds) == 3
+    assert np.isnan(speeds[1])  # two samples at t=20
+    assert np.isclose(speeds[0], 0.0005 * 111195 / 20, rtol=1e-3)
+    assert a.max_speed() == np.nanmax(speeds)
+
+
+def test_loiter_uses_latest_timestamp_not_last_seen():
+    rule = {"type": "loiter", "loiter_time_seconds": 60}
+    events = [
+        {"entity_id": "A", "timestamp_offset_seconds": 0, "coords": [0, 0]},
+        {"entity_id": "A", "timestamp_offset_seconds": 90, "coords": [0, 0]},
+        {"entity_id": "A", "timestamp_offset_seconds": 10, "coords": [0, 0]},
+    ]
+    (alert,) = evaluate_events(events, rule)
+    assert alert["evidence"][0]["duration"] == 90
+    assert len(StreamingEvaluator(rule).push_many(list(reversed(events)))) == 1
+
+
+def test_radius_loiter_streams_events_with_partial_coords_like_batch():
+    events = [
+        {"entity_id": "a", "latitude": 1.0, "timestamp": 0},
+        {"entity_id": "a", "coords": [1.0, 2.0], "timestamp": 10},
+        {"entity_id": "a", "latitude": 1.0, "longitude": None, "timestamp": 40},
+        {"entity_id": "a", "coords": [1.0, 2.0], "timestamp": 50},
+        {"entity_id": "a", "coords": [1.0, 2.0], "timestamp": 200},
+    ]
+    for params in ({"radius_m": 100, "center": [1, 2]}, {"radius_m": 100}):
+        rule = {"type": "loiter", "loiter_time_seconds": 60, "params": params}
+        streamed = StreamingEvaluator(rule).push_many(events)
+        batch = evaluate_events(events, rule)
+        assert len(streamed) == len(batch) == 1
+        assert streamed[0]["evidence"] == batch[0]["evidence"]
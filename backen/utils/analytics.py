@@ -0,0 +1,44 @@
+"""SQL aggregates over the denormalized SimulationRun summary columns."""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import String, bindparam, case, func, select
+
+
+def rule_metrics_stmt(run_model: Any, window_hours: Optional[float] = None) -> Any:
+    """Per-rule run counts, detection totals and averages, optionally limited to the last ``window_hours``."""
+    detected = func.sum(case((run_model.detected == True, 1), else_=0)).label("detected")
+    stmt = select(
+        run_model.rule_id,
+        func.count(run_model.id).label("runs"),
+        detected,
+        func.sum(run_model.alert_count).label("alerts"),
+        func.sum(run_model.event_count).label("events"),
+        func.sum(run_model.bypassed_events_count).label("bypassed_events"),
+        func.avg(run_model.duration_ms).label("avg_duration_ms"),
+    ).group_by(run_model.rule_id)
+    if window_hours is not None:
+        # created_at is stored as 'YYYY-MM-DD HH:MM:SS' (UTC); compare as text so the index applies
+        since = (datetime.utcnow() - timedelta(hours=window_hours)).strftime("%Y-%m-%d %H:%M:%S")
+        stmt = stmt.where(run_model.created_at >= bindparam("since", since, type_=String))
+    return stmt
+
+
+def format_rule_metrics(rows: List[Any]) -> List[Dict[str, Any]]:
+    out = []
+    for r in rows:
+        runs = r.runs or 0
+        detected = int(r.detected or 0)
+        out.append({
+            "rule_id": r.rule_id,
+            "runs": runs,
+            "detected": detected,
+            "bypassed": runs - detected,
+            "detection_rate": detected / runs if runs else 0.0,
+            "bypass_rate": (runs - detected) / runs if runs else 0.0,
+            "alerts": int(r.alerts or 0),
+            "events": int(r.events or 0),
+            "bypassed_events": int(r.bypassed_events or 0),
+            "avg_duration_ms": float(r.avg_duration_ms) if r.avg_duration_ms is not None else None,
+        })
+    return out
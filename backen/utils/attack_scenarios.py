@@ -27,5 +27,6 @@ def generate_relay_attack(zone_center: Tuple[float, float] = (31.62, 74.87), dro
     return ScenarioModel(scenario_id=_mk_id("SCN"), description="relay attack generated", event_sequence=seq)
 
 
-def generate_variants(n: int = 3):
-    return [generate_relay_attack() for _ in range(n)]
+def generate_variants(n: int = 3, **params):
+    """Generate ``n`` relay attacks; ``params`` are passed to ``generate_relay_attack``."""
+    return [generate_relay_attack(**params) for _ in range(n)]
@@ -0,0 +1,92 @@
+"""Geodesic distance helpers shared by the rule engines.
+
+Scalar ``haversine_meters`` for one-off checks plus NumPy kernels for one
+point against many and N x M pairwise distances. Radii below
+``EQUIRECT_MAX_RADIUS_M`` use the equirectangular approximation, whose error
+at that scale is far below GPS noise.
+"""
+from typing import Optional, Sequence
+from math import radians, cos, sin, asin, sqrt
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+EQUIRECT_MAX_RADIUS_M = 1000.0
+
+
+def haversine_meters(a: Sequence[float], b: Sequence[float]) -> float:
+    lat1, lon1 = a
+    lat2, lon2 = b
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    hav = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(sqrt(min(hav, 1.0)))
+
+
+def distance_meters(lat1: float, lon1: float, lat2: float, lon2: float, radius_m: Optional[float] = None) -> float:
+    """Scalar ``distances_to_many`` (same formula choice), for per-event checks."""
+    if radius_m is not None and radius_m <= EQUIRECT_MAX_RADIUS_M:
+        dlon = (lon2 - lon1 + 180.0) % 360.0 - 180.0
+        x = radians(dlon) * cos(radians((lat1 + lat2) / 2))
+        y = radians(lat2 - lat1)
+        return EARTH_RADIUS_M * sqrt(x * x + y * y)
+    return haversine_meters((lat1, lon1), (lat2, lon2))
+
+
+def haversine_to_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distances in metres from (lat, lon) to each of ``lats``/``lons`` (degrees)."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    hav = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(hav, 1.0)))
+
+
+def equirect_to_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Equirectangular approximation of ``haversine_to_many``; accurate for short ranges."""
+    lats = np.asarray(lats, dtype=np.float64)
+    dlon = (np.asarray(lons, dtype=np.float64) - lon + 180.0) % 360.0 - 180.0
+    x = np.radians(dlon) * np.cos(np.radians((lats + lat) / 2))
+    y = np.radians(lats - lat)
+    return EARTH_RADIUS_M * np.sqrt(x * x + y * y)
+
+
+def distances_to_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, radius_m: Optional[float] = None) -> np.ndarray:
+    """One point vs. N points, taking the equirectangular fast path when only
+    distances up to a sub-kilometre ``radius_m`` matter."""
+    if radius_m is not None and radius_m <= EQUIRECT_MAX_RADIUS_M:
+        return equirect_to_many(lat, lon, lats, lons)
+    return haversine_to_many(lat, lon, lats, lons)
+
+
+def within_radius(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, radius_m: float) -> np.ndarray:
+    """Boolean mask of the points within ``radius_m`` metres of (lat, lon)."""
+    return distances_to_many(lat, lon, lats, lons, radius_m) <= radius_m
+
+
+def pairwise_distances(lats_a: np.ndarray, lons_a: np.ndarray, lats_b: np.ndarray, lons_b: np.ndarray, radius_m: Optional[float] = None) -> np.ndarray:
+    """N x M distance matrix in metres between two point sets."""
+    lats_a = np.asarray(lats_a, dtype=np.float64)[:, None]
+    lons_a = np.asarray(lons_a, dtype=np.float64)[:, None]
+    lats_b = np.asarray(lats_b, dtype=np.float64)[None, :]
+    lons_b = np.asarray(lons_b, dtype=np.float64)[None, :]
+    if radius_m is not None and radius_m <= EQUIRECT_MAX_RADIUS_M:
+        dlon = (lons_b - lons_a + 180.0) % 360.0 - 180.0
+        x = np.radians(dlon) * np.cos(np.radians((lats_a + lats_b) / 2))
+        y = np.radians(lats_b - lats_a)
+        return EARTH_RADIUS_M * np.sqrt(x * x + y * y)
+    dlat = np.radians(lats_b - lats_a)
+    dlon = np.radians(lons_b - lons_a)
+    hav = np.sin(dlat / 2) ** 2 + np.cos(np.radians(lats_a)) * np.cos(np.radians(lats_b)) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(hav, 1.0)))
+
+
+def segment_lengths(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Haversine length in metres of each step along a track (``len(lats) - 1`` values)."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    dlat = np.diff(lats)
+    dlon = np.diff(lons)
+    hav = np.sin(dlat / 2) ** 2 + np.cos(lats[:-1]) * np.cos(lats[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(hav, 1.0)))
@@ -0,0 +1,243 @@
+"""Fast scenario ingestion: JSON straight into struct-of-arrays columns.
+
+``ScenarioModel.parse_obj`` builds one ``EventModel`` per event and the engine
+then re-reads every attribute. ``ScenarioColumns.parse`` validates the same
+fields in one pass over the decoded JSON and keeps each field as a column
+(lists for strings/metadata, NumPy arrays for time and coordinates), which the
+engine and ``TrackStore`` consume directly. Decoding uses orjson when it is
+installed and falls back to the standard library.
+
+Coercion follows the Pydantic models: IDs and actions may be numbers (stored
+as strings), offsets may be numeric strings or floats (truncated to int).
+Coordinates must be a [lat, lon] pair.
+"""
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def loads(data: Any) -> Any:
+    """Decode JSON bytes/str with orjson when available; raises ValueError either way."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class IngestError(ValueError):
+    """Payload failed validation; the message names the offending field."""
+
+
+def _str(value: Any, where: str, optional: bool = False) -> Optional[str]:
+    if isinstance(value, str):
+        return value
+    if value is None and optional:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise IngestError(f"{where}: expected a string, got {value!r}")
+
+
+def _int(value: Any, where: str) -> int:
+    if type(value) is int:
+        return value
+    if isinstance(value, (float, str)) and not isinstance(value, bool):
+        try:
+            return int(value)
+        except (ValueError, OverflowError):
+            # 'x', NaN, or an infinity (1e999/Infinity from the stdlib decoder)
+            pass
+    raise IngestError(f"{where}: expected an integer, got {value!r}")
+
+
+def _coords(value: Any, where: str) -> List[float]:
+    if isinstance(value, list) and len(value) == 2:
+        lat, lon = value
+        if type(lat) is float and type(lon) is float:
+            return value
+        try:
+            if not isinstance(lat, bool) and not isinstance(lon, bool):
+                return [float(lat), float(lon)]
+        except (TypeError, ValueError):
+            pass
+    raise IngestError(f"{where}: expected [lat, lon] numbers, got {value!r}")
+
+
+def validate_event(ev: Any, where: str = "event") -> Dict[str, Any]:
+    """One event validated like ``EventColumns.parse``, as an ``EventModel.dict()``-shaped record.
+
+    For events that arrive one at a time (e.g. streamed AI output).
+    """
+    if not isinstance(ev, dict):
+        raise IngestError(f"{where}: expected an object")
+    try:
+        record = {
+            "entity_id": _str(ev["entity_id"], f"{where}.entity_id"),
+            "entity_type": _str(ev.get("entity_type", "unknown"), f"{where}.entity_type", optional=True),
+            "action": _str(ev["action"], f"{where}.action"),
+            "timestamp_offset_seconds": _int(ev["timestamp_offset_seconds"], f"{where}.timestamp_offset_seconds"),
+            "coords": _coords(ev["coords"], f"{where}.coords"),
+            "metadata": ev.get("metadata"),
+        }
+    except KeyError as e:
+        raise IngestError(f"{where}.{e.args[0]}: field required")
+    if record["metadata"] is not None and not isinstance(record["metadata"], dict):
+        raise IngestError(f"{where}.metadata: expected an object, got {record['metadata']!r}")
+    return record
+
+
+class EventColumns:
+    """Validated event sequence as parallel columns, in input order."""
+
+    __slots__ = ("entity_id", "entity_type", "action", "t", "coords", "metadata", "_times", "_lat", "_lon")
+
+    def __init__(self, entity_id: List[str], entity_type: List[Optional[str]], action: List[str], t: List[int], coords: List[List[float]], metadata: List[Optional[Dict[str, Any]]]):
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.action = action
+        self.t = t
+        self.coords = coords
+        self.metadata = metadata
+        self._times = None
+        self._lat = None
+        self._lon = None
+
+    @classmethod
+    def parse(cls, events: Any, where: str = "event_sequence") -> "EventColumns":
+        if not isinstance(events, list):
+            raise IngestError(f"{where}: expected a list of events")
+        n = len(events)
+        entity_id: List[str] = [None] * n
+        entity_type: List[Optional[str]] = [None] * n
+        action: List[str] = [None] * n
+        t: List[int] = [0] * n
+        coords: List[List[float]] = [None] * n
+        metadata: List[Optional[Dict[str, Any]]] = [None] * n
+        for i, ev in enumerate(events):
+            if not isinstance(ev, dict):
+                raise IngestError(f"{where}[{i}]: expected an object")
+            try:
+                entity_id[i] = _str(ev["entity_id"], f"{where}[{i}].entity_id")
+                action[i] = _str(ev["action"], f"{where}[{i}].action")
+                t[i] = _int(ev["timestamp_offset_seconds"], f"{where}[{i}].timestamp_offset_seconds")
+                coords[i] = _coords(ev["coords"], f"{where}[{i}].coords")
+            except KeyError as e:
+                raise IngestError(f"{where}[{i}].{e.args[0]}: field required")
+            entity_type[i] = _str(ev.get("entity_type", "unknown"), f"{where}[{i}].entity_type", optional=True)
+            meta = ev.get("metadata")
+            if meta is not None and not isinstance(meta, dict):
+                raise IngestError(f"{where}[{i}].metadata: expected an object, got {meta!r}")
+            metadata[i] = meta
+        return cls(entity_id, entity_type, action, t, coords, metadata)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def _split_coords(self) -> None:
+        xy = np.array(self.coords, dtype=np.float64).reshape(len(self.coords), 2)
+        self._lat, self._lon = xy[:, 0], xy[:, 1]
+
+    @property
+    def times(self) -> np.ndarray:
+        """``t`` as an int64 array."""
+        if self._times is None:
+            self._times = np.array(self.t, dtype=np.int64)
+        return self._times
+
+    @property
+    def lat(self) -> np.ndarray:
+        if self._lat is None:
+            self._split_coords()
+        return self._lat
+
+    @property
+    def lon(self) -> np.ndarray:
+        if self._lon is None:
+            self._split_coords()
+        return self._lon
+
+    def normalized(self) -> List[Dict[str, Any]]:
+        """Engine event dicts (see ``rule_engine._normalize_event``)."""
+        return [
+            {"entity_id": e, "action": a, "coords": c, "timestamp": ts, "metadata": m or {}}
+            for e, a, c, ts, m in zip(self.entity_id, self.action, self.coords, self.t, self.metadata)
+        ]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Dicts equal to ``EventModel.dict()`` for each event."""
+        return [
+            {"entity_id": e, "entity_type": et, "action": a, "timestamp_offset_seconds": ts, "coords": c, "metadata": m}
+            for e, et, a, ts, c, m in zip(self.entity_id, self.entity_type, self.action, self.t, self.coords, self.metadata)
+        ]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.records())
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if not slot.startswith("_")}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._times = self._lat = self._lon = None
+
+
+class ScenarioColumns:
+    """A validated scenario whose events are ``EventColumns``.
+
+    Other top-level keys (e.g. ``zone``) are kept in ``extra``; pass the
+    Pydantic ``model`` to ``parse`` to validate the ones it declares.
+    """
+
+    __slots__ = ("scenario_id", "description", "events", "extra")
+
+    def __init__(self, scenario_id: str, description: Optional[str], events: EventColumns, extra: Optional[Dict[str, Any]] = None):
+        self.scenario_id = scenario_id
+        self.description = description
+        self.events = events
+        self.extra = extra or {}
+
+    @classmethod
+    def parse(cls, payload: Any, model: Any = None) -> "ScenarioColumns":
+        if not isinstance(payload, dict):
+            raise IngestError("scenario: expected an object")
+        if "scenario_id" not in payload:
+            raise IngestError("scenario_id: field required")
+        if "event_sequence" not in payload:
+            raise IngestError("event_sequence: field required")
+        extra = {}
+        for key, value in payload.items():
+            if key in ("scenario_id", "description", "event_sequence"):
+                continue
+            field = model.__fields__.get(key) if model is not None else None
+            if field is not None:
+                value, errors = field.validate(value, {}, loc=key)
+                if errors:
+                    raise IngestError(f"{key}: invalid value {payload[key]!r}")
+            extra[key] = value
+        return cls(
+            _str(payload["scenario_id"], "scenario_id"),
+            _str(payload.get("description", ""), "description", optional=True),
+            EventColumns.parse(payload["event_sequence"]),
+            extra,
+        )
+
+    @classmethod
+    def from_model(cls, model: Any) -> "ScenarioColumns":
+        """Columns for an already-validated ScenarioModel (e.g. a generated attack)."""
+        return cls.parse(model.dict())
+
+    @property
+    def event_sequence(self) -> EventColumns:
+        return self.events
+
+    def to_model(self, scenario_cls: Any, event_cls: Any) -> Any:
+        """Build ``scenario_cls`` without re-validating (see ``parse(model=...)``)."""
+        fields = {k: v for k, v in self.extra.items() if k in scenario_cls.__fields__}
+        events = [event_cls.construct(**r) for r in self.events.records()]
+        return scenario_cls.construct(scenario_id=self.scenario_id, description=self.description, event_sequence=events, **fields)
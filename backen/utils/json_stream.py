@@ -0,0 +1,153 @@
+"""Incremental parsing of a streamed scenario's ``event_sequence``.
+
+An AI-generated scenario arrives as a JSON object in arbitrary text chunks.
+``EventSequenceParser.feed`` scans only the new text and returns each element
+of the top-level ``event_sequence`` array as soon as its closing brace arrives,
+so events can be validated and forwarded before the body is complete.
+``finish`` parses the whole object (for ``scenario_id``/``description``).
+Text before the first ``{`` (e.g. a Markdown fence) is ignored.
+
+``scenario_messages`` turns a chunk stream into messages; the routes send them
+with ``streaming.py``.
+"""
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from backen.utils.ingest import IngestError, validate_event
+
+# characters that can change the parser state outside strings / inside strings
+_STRUCTURAL = re.compile(r'[{}\[\]":]')
+_IN_STRING = re.compile(r'["\\]')
+
+
+class EventSequenceParser:
+    def __init__(self, key: str = "event_sequence"):
+        self.key = key
+        # every chunk, joined once by finish()
+        self._chunks: List[str] = []
+        # unscanned text plus the open event/string; positions below are relative to it
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._await_array = False
+        self._array_depth: Optional[int] = None
+        self._event_start: Optional[int] = None
+        self.count = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Append ``chunk``; return the array elements completed by it (decoded JSON)."""
+        self._chunks.append(chunk)
+        text = self._buf + chunk
+        done = []
+        pos = self._pos
+        while True:
+            if self._in_string:
+                m = _IN_STRING.search(text, pos)
+                if m is None:
+                    pos = len(text)
+                    break
+                if m.group() == "\\":
+                    if m.end() >= len(text):
+                        # the escaped character has not arrived yet
+                        pos = m.start()
+                        break
+                    pos = m.end() + 1
+                    continue
+                self._in_string = False
+                pos = m.end()
+                if self._depth == 1:
+                    self._last_key = text[self._string_start + 1:m.start()]
+                continue
+            m = _STRUCTURAL.search(text, pos)
+            if m is None:
+                pos = len(text)
+                break
+            ch, pos = m.group(), m.end()
+            # only a '[' directly after "event_sequence": opens the array we stream
+            await_array, self._await_array = self._await_array, False
+            if ch == '"':
+                self._in_string = True
+                self._string_start = m.start()
+            elif ch == ":":
+                self._await_array = self._depth == 1 and self._last_key == self.key
+                self._last_key = None
+            elif ch in "{[":
+                if ch == "{" and self._depth == self._array_depth:
+                    self._event_start = m.start()
+                if ch == "[" and await_array:
+                    self._array_depth = 2
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if ch == "}" and self._depth == self._array_depth and self._event_start is not None:
+                        done.append(json.loads(text[self._event_start:pos]))
+                        self._event_start = None
+                        self.count += 1
+                    elif ch == "]" and self._depth == self._array_depth - 1:
+                        self._array_depth = None
+        # drop the consumed prefix so each feed only copies what is still needed
+        keep = pos
+        if self._event_start is not None:
+            keep = min(keep, self._event_start)
+        if self._in_string and self._depth == 1:
+            # a top-level string may be the key that precedes event_sequence
+            keep = min(keep, self._string_start)
+        self._buf = text[keep:]
+        self._pos = pos - keep
+        self._string_start -= keep
+        if self._event_start is not None:
+            self._event_start -= keep
+        return done
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def finish(self) -> Dict[str, Any]:
+        """The complete top-level object; raises ValueError if the text is not one."""
+        text = self.text
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise ValueError("no JSON object in AI output")
+        return json.loads(text[start:end + 1])
+
+
+async def scenario_messages(chunks: AsyncIterator[str], fallback: Callable[[], Any]) -> AsyncIterator[Dict[str, Any]]:
+    """``event`` messages as events become valid, then one ``scenario`` message.
+
+    Elements that fail validation are reported as ``invalid_event`` and skipped.
+    If the upstream fails or yields no valid event before any event was sent,
+    the scenario from ``fallback()`` (a ScenarioModel) is streamed instead; a
+    failure after that ends the stream with an ``error`` message.
+    """
+    parser = EventSequenceParser()
+    sent = 0
+    try:
+        async for chunk in chunks:
+            done = parser.feed(chunk)
+            for index, ev in enumerate(done, parser.count - len(done)):
+                try:
+                    record = validate_event(ev, f"event_sequence[{index}]")
+                except IngestError as e:
+                    yield {"type": "invalid_event", "index": index, "detail": str(e)}
+                    continue
+                sent += 1
+                yield {"type": "event", "index": index, "event": record}
+        scenario = parser.finish()
+        if not sent:
+            raise ValueError("AI output has no valid events")
+    except Exception as e:
+        if sent:
+            yield {"type": "error", "detail": str(e)}
+            return
+        scenario = fallback().dict()
+        for index, record in enumerate(scenario["event_sequence"]):
+            yield {"type": "event", "index": index, "event": record}
+        yield {"type": "scenario", "source": "fallback", "scenario_id": scenario["scenario_id"], "description": scenario.get("description"), "event_count": len(scenario["event_sequence"]), "detail": str(e)}
+        return
+    yield {"type": "scenario", "source": "ai", "scenario_id": scenario.get("scenario_id"), "description": scenario.get("description"), "event_count": sent}
@@ -0,0 +1,52 @@
+"""Keyset (cursor) pagination and field projection helpers for list endpoints."""
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import String, and_, bindparam, or_, type_coerce
+
+
+def encode_cursor(created_raw: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_raw}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_raw, row_id = raw.rsplit("|", 1)
+        return created_raw, int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def raw_column(col: Any, label: str) -> Any:
+    """Select ``col`` as its stored string so cursors compare byte-for-byte with
+    the database value (SQLite keeps CURRENT_TIMESTAMP without microseconds)."""
+    return type_coerce(col, String).label(label)
+
+
+def keyset_page(stmt: Any, created_col: Any, id_col: Any, cursor: Optional[str], limit: int) -> Any:
+    """Newest-first page of ``stmt`` after ``cursor``, fetching one extra row to
+    detect whether another page exists."""
+    if cursor:
+        created_raw, row_id = decode_cursor(cursor)
+        c = bindparam("cursor_created", created_raw, type_=String)
+        stmt = stmt.where(or_(created_col < c, and_(created_col == c, id_col < row_id)))
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def parse_fields(fields: Optional[str], available: Dict[str, Any], presets: Dict[str, List[str]]) -> Optional[List[str]]:
+    """Resolve ``fields=`` into column names; None means the legacy full payload."""
+    if not fields:
+        return None
+    names: List[str] = []
+    for part in fields.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        for name in presets.get(part, [part]):
+            if name not in available:
+                raise ValueError(f"Unknown field {name!r}; expected one of {sorted(available)} or {sorted(presets)}")
+            if name not in names:
+                names.append(name)
+    return names
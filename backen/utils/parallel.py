@@ -0,0 +1,71 @@
+"""Shared process pool for CPU-bound rule evaluation."""
+import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "0")) or (os.cpu_count() or 1)
+# below this many items the IPC cost outweighs the parallel speedup
+PARALLEL_MIN_ITEMS = int(os.getenv("PARALLEL_MIN_ITEMS", "16"))
+# a single job at least this large (e.g. events in a scenario) goes to the pool; smaller ones to a thread
+PROCESS_MIN_SIZE = int(os.getenv("PROCESS_MIN_SIZE", "5000"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the lazily created, process-wide evaluation pool."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=EVAL_WORKERS)
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+class Timed:
+    """Picklable wrapper returning ``(fn(x), elapsed_ms)``."""
+
+    def __init__(self, fn: Callable[[Any], Any]):
+        self.fn = fn
+
+    def __call__(self, x: Any):
+        started = time.perf_counter()
+        out = self.fn(x)
+        return out, (time.perf_counter() - started) * 1000.0
+
+
+def _chunksize(n: int, workers: int) -> int:
+    return max(1, n // (workers * 4))
+
+
+def parallel_map(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+    """Map a picklable top-level ``fn`` over ``items`` across the pool, preserving order."""
+    items = list(items)
+    if EVAL_WORKERS <= 1 or len(items) < PARALLEL_MIN_ITEMS:
+        return [fn(it) for it in items]
+    return list(get_process_pool().map(fn, items, chunksize=_chunksize(len(items), EVAL_WORKERS)))
+
+
+async def parallel_map_async(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+    """``parallel_map`` without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, parallel_map, fn, list(items))
+
+
+async def run_off_loop(fn: Callable[[Any], Any], item: Any, size: int = 0) -> Any:
+    """``fn(item)`` without blocking the event loop.
+
+    Jobs of ``size`` >= PROCESS_MIN_SIZE run in the process pool (``fn`` and
+    ``item`` must be picklable); smaller ones in the default thread pool,
+    where pickling would cost more than the evaluation.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_process_pool() if EVAL_WORKERS > 1 and size >= PROCESS_MIN_SIZE else None
+    return await loop.run_in_executor(executor, fn, item)
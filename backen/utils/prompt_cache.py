@@ -0,0 +1,126 @@
+"""TTL cache of Gemini responses keyed by prompt hash.
+
+Red/blue-team loops send the same prompt (same rule, same attack log) over and
+over. Responses are kept in a bounded in-process LRU and, optionally, in the
+``ai_generated`` table (``AIGeneratedScenario``: ``scenario_id`` holds the
+prompt key, ``scenario_json`` the response, ``created_at`` drives the TTL), so
+other workers and restarts reuse them too. Only successful AI responses should
+be stored; fallbacks are regenerated on every call.
+
+The database tier is best-effort: failures are logged and treated as misses.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger("prompt_cache")
+
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "256"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "1") not in ("0", "false", "no")
+# requests carrying this header with value "bypass" skip the lookup (the fresh response is still stored)
+AI_CACHE_HEADER = "X-AI-Cache"
+
+
+def prompt_key(endpoint: Optional[str], prompt: str, max_tokens: int, stream: bool = False) -> str:
+    # streamed and plain requests send different payloads (and may get different bodies)
+    payload = json.dumps([endpoint, prompt, max_tokens, stream], separators=(",", ":")).encode()
+    return "prompt:" + hashlib.sha256(payload).hexdigest()
+
+
+def cache_bypassed(headers: Any) -> bool:
+    return headers.get(AI_CACHE_HEADER, "").strip().lower() == "bypass"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PromptCache:
+    """LRU with per-entry expiry in front of an optional ``AIGeneratedScenario`` table.
+
+    ``session_factory`` is an async sessionmaker; the table is read and written
+    in its own short session, outside the caller's transaction.
+    """
+
+    def __init__(self, model: Any = None, session_factory: Any = None, maxsize: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL, persist: bool = AI_CACHE_PERSIST):
+        self.model = model if persist and session_factory is not None else None
+        self.session_factory = session_factory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (monotonic expiry, response)
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, response: Dict[str, Any], age: float = 0.0) -> None:
+        self._lru[key] = (time.monotonic() + self.ttl - age, response)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return entry[1]
+
+    def _load(self, db, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        row = db.query(self.model.scenario_json, self.model.created_at).filter(self.model.scenario_id == key).first()
+        if row is None or row.created_at is None:
+            return None
+        created = row.created_at
+        if created.tzinfo is not None:
+            created = created.astimezone(timezone.utc).replace(tzinfo=None)
+        age = (_utcnow() - created).total_seconds()
+        return (row.scenario_json, age) if age < self.ttl else None
+
+    def _store(self, db, key: str, response: Dict[str, Any]) -> None:
+        raw = response.get("raw", response.get("content"))
+        values = {"scenario_json": response, "raw_ai_output": raw if isinstance(raw, str) else None, "created_at": _utcnow()}
+        updated = db.query(self.model).filter(self.model.scenario_id == key).update(values, synchronize_session=False)
+        if not updated:
+            db.add(self.model(scenario_id=key, **values))
+        db.commit()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self._lookup(key)
+        if response is None and self.model is not None:
+            try:
+                async with self.session_factory() as db:
+                    found = await db.run_sync(self._load, key)
+            except SQLAlchemyError:
+                logger.warning("AI cache read failed for %s", key, exc_info=True)
+                found = None
+            if found is not None:
+                response, age = found
+                self._remember(key, response, age)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def put(self, key: str, response: Dict[str, Any]) -> None:
+        self._remember(key, response)
+        if self.model is None:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.run_sync(self._store, key, response)
+        except SQLAlchemyError:
+            logger.warning("AI cache write failed for %s", key, exc_info=True)
+
+    def clear(self) -> None:
+        self._lru.clear()
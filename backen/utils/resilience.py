@@ -0,0 +1,110 @@
+"""Building blocks for calling a rate-limited upstream: token bucket, backoff, circuit breaker.
+
+They are loop-agnostic (no asyncio primitives are created at import time) and
+are wired together for the Gemini calls in ``backen/services/http_client.py``.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class TokenBucket:
+    """``rate`` tokens per second, bursting up to ``capacity``; ``rate <= 0`` disables limiting."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter; an upstream Retry-After (capped) takes precedence."""
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and fails fast for ``reset_after`` seconds.
+
+    After that one trial call is let through (half-open): success closes the
+    circuit, failure opens it again. A trial that never reports back (e.g. a
+    cancelled request) is replaced by a new one after another ``reset_after``.
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        state = self.state
+        if state == "closed":
+            return
+        now = time.monotonic()
+        if state == "open" or (self._trial_at is not None and now - self._trial_at < self.reset_after):
+            raise CircuitOpenError("upstream circuit open")
+        self._trial_at = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_at is not None or (self.threshold > 0 and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+        self._trial_at = None
@@ -0,0 +1,52 @@
+"""orjson responses for large results the server built itself.
+
+FastAPI validates a route's return value against its ``response_model`` and then
+walks it with ``jsonable_encoder`` before ``json.dumps``; for a run that embeds
+tens of thousands of events this dominates the request. Results produced by the
+engine (or read back from our own cache/log tables) are already valid, so with
+``FAST_JSON_RESPONSES=1`` routes return them through ``trusted_response``: a
+Response is passed through by FastAPI untouched and orjson serializes Pydantic
+models from their field values. Without orjson installed the response falls back to
+``jsonable_encoder`` + the standard JSONResponse. ``response_model`` stays on the
+routes for the OpenAPI schema.
+"""
+import os
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "0") in ("1", "true", "yes")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        # field values only; orjson calls back here for nested models
+        return obj.__dict__
+    return jsonable_encoder(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; accepts Pydantic models anywhere in ``content``."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def trusted_response(content: Any, fast: Optional[bool] = None) -> Any:
+    """``content`` wrapped in a FastJSONResponse (skipping response_model checks) when enabled.
+
+    ``fast`` overrides ``FAST_JSON_RESPONSES`` for a single call; otherwise the
+    content is returned unchanged for FastAPI's usual validation/encoding.
+    """
+    if not (FAST_JSON_RESPONSES if fast is None else fast):
+        return content
+    return FastJSONResponse(content)
@@ -0,0 +1,197 @@
+"""Content-addressed cache of run results keyed by (engine version, scenario hash, rule hash).
+
+Two tiers: a bounded in-process LRU and an optional table in the app
+database (``cache_model``, a model with ``key``/``payload``/``created_at``
+columns) shared by every worker. Payloads are JSON-ready result dicts.
+Alert IDs are not cached: ``strip_alert_ids`` removes them before a result is
+stored and ``with_fresh_alert_ids`` issues new ones on every hit, so two runs
+never share an alert_id. Entries expire after ``RESULT_CACHE_TTL`` seconds and the table is pruned to
+``RESULT_CACHE_MAX_ROWS`` rows whenever new results are stored.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_PERSIST = os.getenv("RESULT_CACHE_PERSIST", "1") not in ("0", "false", "no")
+# hash entity/package IDs by order of first appearance so regenerated scenarios hit
+RESULT_CACHE_IGNORE_IDS = os.getenv("RESULT_CACHE_IGNORE_IDS", "0") in ("1", "true", "yes")
+# seconds a stored result stays valid; 0 keeps entries until they are evicted
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+# upper bound on rows in the result_cache table; 0 disables the cap
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "100000"))
+
+# Part of every key: bump it whenever rule_engine/rule_compiler change what a
+# run evaluates to (alerts, evidence, detection), so stale results stop matching.
+ENGINE_VERSION = 1
+
+
+def _canonical(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def _event_dict(ev: Any) -> Dict[str, Any]:
+    return ev.dict() if hasattr(ev, "dict") else dict(ev)
+
+
+def scenario_hash(events: Iterable[Any], ignore_ids: bool = RESULT_CACHE_IGNORE_IDS) -> str:
+    """Hash of the event sequence only (scenario_id and description are ignored).
+
+    With ``ignore_ids`` entity IDs and metadata ``package_id`` values are replaced
+    by their order of first appearance, so two generated scenarios that differ
+    only in IDs share a key. A hit then returns the cached evidence, which
+    names the IDs of the run that populated the cache; the events in the
+    response are always the request's own.
+    """
+    h = hashlib.sha256()
+    aliases: Dict[Any, str] = {}
+
+    def alias(value: Any) -> Any:
+        if value not in aliases:
+            aliases[value] = f"#{len(aliases)}"
+        return aliases[value]
+
+    for ev in events:
+        e = _event_dict(ev)
+        if ignore_ids:
+            e["entity_id"] = alias(e.get("entity_id"))
+            meta = e.get("metadata")
+            if isinstance(meta, dict) and "package_id" in meta:
+                e["metadata"] = dict(meta, package_id=alias(meta["package_id"]))
+        h.update(_canonical(e))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def rule_hash(rule_json: Optional[Dict[str, Any]]) -> str:
+    return hashlib.sha256(_canonical(rule_json)).hexdigest()
+
+
+def cache_key(events: Iterable[Any], rule_json: Optional[Dict[str, Any]]) -> str:
+    return f"v{ENGINE_VERSION}:{scenario_hash(events)}:{rule_hash(rule_json)}"
+
+
+def strip_alert_ids(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a JSON-encoded result without per-run alert IDs, for storing."""
+    return dict(payload, alerts=[{k: v for k, v in a.items() if k != "alert_id"} for a in payload.get("alerts", [])])
+
+
+def with_fresh_alert_ids(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a cached result whose alerts get new IDs; the cached dicts are not modified."""
+    return dict(payload, alerts=[dict(a, alert_id=str(uuid.uuid4())) for a in payload.get("alerts", [])])
+
+
+class ResultCache:
+    """LRU in front of an optional database table.
+
+    Database methods take a sync Session (use ``AsyncSession.run_sync`` from
+    async routes); writes join the caller's transaction.
+    """
+
+    def __init__(self, cache_model: Any = None, maxsize: int = RESULT_CACHE_SIZE, persist: bool = RESULT_CACHE_PERSIST,
+                 ttl: float = RESULT_CACHE_TTL, max_rows: int = RESULT_CACHE_MAX_ROWS):
+        self.cache_model = cache_model if persist else None
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_rows = max_rows
+        # key -> (time.monotonic() when stored, payload)
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, payload: Dict[str, Any]) -> None:
+        self._lru[key] = (time.monotonic(), payload)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        if self.ttl and time.monotonic() - entry[0] > self.ttl:
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return entry[1]
+
+    def _cutoff(self) -> datetime:
+        # created_at is filled in by the database (UTC)
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def get_many(self, db, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for key in keys:
+            payload = self._recall(key)
+            if payload is not None:
+                found[key] = payload
+            else:
+                missing.append(key)
+        if missing and self.cache_model is not None and db is not None:
+            model = self.cache_model
+            unique = list(dict.fromkeys(missing))
+            for i in range(0, len(unique), 500):
+                query = db.query(model.key, model.payload).filter(model.key.in_(unique[i:i + 500]))
+                if self.ttl:
+                    query = query.filter(model.created_at >= self._cutoff())
+                for key, payload in query.all():
+                    found[key] = payload
+                    self._remember(key, payload)
+        self.hits += sum(1 for k in keys if k in found)
+        self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def get(self, db, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many(db, [key]).get(key)
+
+    def put_many(self, db, items: Dict[str, Dict[str, Any]]) -> None:
+        for key, payload in items.items():
+            self._remember(key, payload)
+        if items and self.cache_model is not None and db is not None:
+            # expired rows would otherwise block re-inserting their keys
+            self._expire(db)
+            stmt = self.cache_model.__table__.insert()
+            if db.get_bind().dialect.name == "sqlite":
+                # another worker may have stored the same key; don't fail the caller's transaction
+                stmt = stmt.prefix_with("OR IGNORE")
+            keys = list(items)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                existing = {k for (k,) in db.query(self.cache_model.key).filter(self.cache_model.key.in_(chunk)).all()}
+                rows = [{"key": k, "payload": items[k]} for k in chunk if k not in existing]
+                if rows:
+                    db.execute(stmt, rows)
+            self._cap(db)
+
+    def _expire(self, db) -> None:
+        if self.ttl:
+            model = self.cache_model
+            db.query(model).filter(model.created_at < self._cutoff()).delete(synchronize_session=False)
+
+    def _cap(self, db) -> None:
+        model = self.cache_model
+        if self.max_rows:
+            excess = db.execute(select(func.count()).select_from(model.__table__)).scalar() - self.max_rows
+            if excess > 0:
+                oldest = select(model.key).order_by(model.created_at, model.key).limit(excess)
+                db.query(model).filter(model.key.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+
+    def prune(self, db) -> None:
+        """Delete expired rows, then the oldest rows beyond ``max_rows``."""
+        if self.cache_model is not None and db is not None:
+            self._expire(db)
+            self._cap(db)
+
+    def put(self, db, key: str, payload: Dict[str, Any]) -> None:
+        self.put_many(db, {key: payload})
+
+    def clear(self) -> None:
+        self._lru.clear()
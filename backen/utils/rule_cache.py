@@ -0,0 +1,74 @@
+"""In-process cache of the active rule, validated against a DB version counter."""
+from collections import namedtuple
+from typing import Any, Callable, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+CachedRule = namedtuple("CachedRule", ["rule_id", "rule_json", "description", "active", "version"])
+
+_STATE_ID = 1
+
+
+def _default_build(rule: Any, version: int) -> CachedRule:
+    return CachedRule(rule.rule_id, rule.rule_json, rule.description, rule.active, version)
+
+
+class ActiveRuleCache:
+    """Caches a detached snapshot of the active rule.
+
+    Each lookup reads only the single-row ``version`` counter; the rule row
+    and its JSON are reloaded when the counter differs from the cached one.
+    Writers call ``bump`` inside the transaction that changes the active
+    rule, so every worker sharing the database sees the change.
+
+    ``build(rule, version)`` turns the ORM row into the cached value; the
+    default is a ``CachedRule`` tuple.
+    """
+
+    def __init__(self, rule_model: Any, state_model: Any, build: Optional[Callable[[Any, int], Any]] = None):
+        self.rule_model = rule_model
+        self.state_model = state_model
+        self.build = build or _default_build
+        self._cached: Optional[Any] = None
+        self._version: Optional[int] = None
+        self._loaded = False
+
+    def current_version(self, db) -> int:
+        version = db.query(self.state_model.version).filter(self.state_model.id == _STATE_ID).scalar()
+        return version or 0
+
+    def get(self, db) -> Optional[Any]:
+        """Return the active rule snapshot, or None when no rule is active."""
+        version = self.current_version(db)
+        if self._loaded and self._version == version:
+            return self._cached
+        rule = db.query(self.rule_model).filter(self.rule_model.active == True).first()
+        cached = self.build(rule, version) if rule is not None else None
+        self._cached, self._version, self._loaded = cached, version, True
+        return cached
+
+    def _ensure_state_row(self, db) -> None:
+        # workers may create the row concurrently: insert-if-absent, never fail
+        table = self.state_model.__table__
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            try:
+                with db.begin_nested():
+                    db.execute(table.insert().values(id=_STATE_ID, version=0))
+            except IntegrityError:
+                pass
+            return
+        db.execute(insert(table).values(id=_STATE_ID, version=0).on_conflict_do_nothing())
+
+    def bump(self, db) -> None:
+        """Increment the version counter in the caller's transaction and drop the local copy."""
+        self._ensure_state_row(db)
+        db.query(self.state_model).filter(self.state_model.id == _STATE_ID).update({self.state_model.version: self.state_model.version + 1}, synchronize_session=False)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self._cached, self._loaded = None, False
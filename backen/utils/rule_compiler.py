@@ -0,0 +1,410 @@
+"""Compile rule_json into reusable detector specs.
+
+A rule is validated and its parameters parsed once; ``CompiledRule.matchers()``
+then hands out fresh per-run state for each detector the rule enables. Specs
+that also define ``detect(tracks)`` are evaluated over a whole scenario's
+``TrackStore`` by ``evaluate_scenario`` instead of event by event. New
+rule types plug in with ``register_detector``: a function that takes the rule
+JSON and returns a spec (anything with a ``matcher()`` method) or None when the
+rule does not enable it.
+
+Compiled rules are cached by content hash, which is what a rule version
+resolves to, so every process-pool worker compiles a given rule once.
+"""
+import heapq
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backen.utils.geodesy import distance_meters, within_radius
+from backen.utils.result_cache import rule_hash
+from backen.utils.spatial_index import GridIndex
+from backen.utils.tracks import TrackStore
+
+COMPILED_RULE_CACHE_SIZE = int(os.getenv("COMPILED_RULE_CACHE_SIZE", "64"))
+
+
+class RuleCompileError(ValueError):
+    """rule_json is malformed (bad parameter types or values)."""
+
+
+def _number(rule_json: Dict[str, Any], key: str, default: float, cast: Callable = float, minimum: float = 0) -> Any:
+    value = rule_json.get(key, default)
+    if isinstance(value, bool):
+        raise RuleCompileError(f"{key} must be a number, got {value!r}")
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise RuleCompileError(f"{key} must be a number, got {value!r}")
+    if value < minimum:
+        raise RuleCompileError(f"{key} must be >= {minimum}, got {value!r}")
+    return value
+
+
+def _alert(rule_id: str, level: str, evidence: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"alert_id": str(uuid.uuid4()), "rule_triggered": rule_id, "level": level, "evidence": evidence}
+
+
+class LoiterMatcher:
+    """Per-run loiter state, one record per entity.
+
+    Without a radius: [earliest, latest, alerted]. Zone mode:
+    [last_ts, last_inside, seconds_inside, alerted]. Anchor mode:
+    [anchor_lat, anchor_lon, anchored_at, alerted].
+    """
+
+    def __init__(self, spec: "LoiterSpec"):
+        self.spec = spec
+        self._entities: Dict[Any, List[Any]] = {}
+        if spec.radius is None:
+            self.push = self._push_span
+        elif spec.center is not None:
+            self.push = self._push_zone
+        else:
+            self.push = self._push_anchor
+
+    def _fire(self, state: List[Any], ent: Any, dur: float, **evidence: Any) -> List[Dict[str, Any]]:
+        state[-1] = True
+        return [_alert(self.spec.rule_id, "high", [dict({"entity_id": ent, "duration": dur}, **evidence)])]
+
+    @staticmethod
+    def _located(coords: Any) -> bool:
+        # as TrackStore.from_events: coords missing or with a None part are no location
+        return bool(coords) and coords[0] is not None and coords[1] is not None
+
+    def _near(self, lat: float, lon: float, coords: Any) -> bool:
+        return distance_meters(lat, lon, coords[0], coords[1], self.spec.radius) <= self.spec.radius
+
+    def _push_span(self, e: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ent = e["entity_id"]
+        ts = e["timestamp"]
+        state = self._entities.get(ent)
+        if state is None:
+            self._entities[ent] = [ts, ts, False]
+            return []
+        # late events widen the span instead of replacing the latest timestamp
+        if ts < state[0]:
+            state[0] = ts
+        elif ts > state[1]:
+            state[1] = ts
+        if state[2]:
+            return []
+        dur = float(state[1] - state[0])
+        if dur > self.spec.loiter_sec:
+            return self._fire(state, ent, dur)
+        return []
+
+    def _push_zone(self, e: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ent = e["entity_id"]
+        ts = e["timestamp"]
+        coords = e["coords"]
+        # an unlocated sample counts as outside, as in Track.zone_dwell
+        inside = self._located(coords) and self._near(self.spec.center[0], self.spec.center[1], coords)
+        state = self._entities.get(ent)
+        if state is None:
+            self._entities[ent] = [ts, inside, 0.0, False]
+            return []
+        if inside and state[1]:
+            state[2] += ts - state[0]
+        state[0], state[1] = ts, inside
+        if not state[3] and state[2] > self.spec.loiter_sec:
+            return self._fire(state, ent, state[2], center=list(self.spec.center))
+        return []
+
+    def _push_anchor(self, e: Dict[str, Any]) -> List[Dict[str, Any]]:
+        coords = e["coords"]
+        # skipped, as in Track.anchored_dwell_crossing
+        if not self._located(coords):
+            return []
+        ent = e["entity_id"]
+        ts = e["timestamp"]
+        state = self._entities.get(ent)
+        if state is None:
+            self._entities[ent] = [coords[0], coords[1], ts, False]
+            return []
+        if state[3]:
+            return []
+        if not self._near(state[0], state[1], coords):
+            state[0], state[1], state[2] = coords[0], coords[1], ts
+            return []
+        dur = float(ts - state[2])
+        if dur > self.spec.loiter_sec:
+            return self._fire(state, ent, dur, anchor=[state[0], state[1]])
+        return []
+
+
+class LoiterSpec:
+    """Loiter for longer than ``loiter_sec``.
+
+    With no ``radius`` this is the time between an entity's first and last
+    sample. With a ``center`` it is the cumulative time within ``radius`` of
+    it; otherwise the continuous time within ``radius`` of the entity's own
+    anchor point, which moves to the first sample that strays outside.
+    """
+
+    rule_id = "loiter_v1"
+
+    def __init__(self, loiter_sec: float, radius: Optional[float] = None, center: Optional[Tuple[float, float]] = None):
+        self.loiter_sec = loiter_sec
+        self.radius = radius
+        self.center = center
+
+    def matcher(self) -> LoiterMatcher:
+        return LoiterMatcher(self)
+
+    def detect(self, tracks: TrackStore) -> List[Tuple[int, Dict[str, Any]]]:
+        """Whole-scenario evaluation: (input index of the triggering event, alert) per entity."""
+        fired = []
+        for track in tracks:
+            extra: Dict[str, Any] = {}
+            if self.radius is None:
+                dwell = track.elapsed()
+            elif self.center is not None:
+                dwell = track.zone_dwell(self.center[0], self.center[1], self.radius)
+                extra["center"] = list(self.center)
+            else:
+                crossing = track.anchored_dwell_crossing(self.radius, self.loiter_sec)
+                if crossing is not None:
+                    i, a = crossing
+                    evidence = {"entity_id": track.entity_id, "duration": float(track.t[i] - track.t[a]), "anchor": [float(track.lat[a]), float(track.lon[a])]}
+                    fired.append((int(track.index[i]), _alert(self.rule_id, "high", [evidence])))
+                continue
+            over = np.flatnonzero(dwell > self.loiter_sec)
+            if len(over):
+                i = over[0]
+                evidence = dict({"entity_id": track.entity_id, "duration": float(dwell[i])}, **extra)
+                fired.append((int(track.index[i]), _alert(self.rule_id, "high", [evidence])))
+        return fired
+
+
+class SequenceMatcher:
+    """Per-run matcher for an ordered event sequence (an NFA over ``spec.steps``).
+
+    ``_partials[j]`` holds partial matches that have completed the first ``j``
+    steps, bucketed in a ``GridIndex`` around the coordinates of their last
+    step, so an event only checks partials in neighbouring cells. Intermediate
+    steps advance every matching partial while keeping the original (the
+    automaton may also take a later event for that step); the final step fires
+    once for the earliest-started match and retires all of its branches.
+    Partials whose first step falls outside the temporal window are pruned.
+    """
+
+    def __init__(self, spec: "SequenceSpec"):
+        self.spec = spec
+        self._partials: List[Optional[GridIndex]] = [None] + [GridIndex(step.radius) for step in spec.steps[1:]]
+        # (start_ts, key, state, origin) for expiry, plus origin -> [(state, key)] branches
+        self._expiry: List[Tuple[float, int, int, int]] = []
+        self._origins: Dict[int, List[Tuple[int, int]]] = {}
+        self._seq = 0
+        self._watermark: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        return sum(len(p) for p in self._partials[1:])
+
+    def _add(self, state: int, origin: int, start_ts: float, ts: float, coords: Any, evidence: Dict[str, Any]) -> None:
+        self._seq += 1
+        key = self._seq
+        if origin is None:
+            origin = key
+        self._partials[state].insert(key, coords[0], coords[1], (origin, start_ts, ts, evidence))
+        self._origins.setdefault(origin, []).append((state, key))
+        heapq.heappush(self._expiry, (start_ts, key, state, origin))
+
+    def push(self, e: Dict[str, Any]) -> List[Dict[str, Any]]:
+        spec = self.spec
+        ts = e["timestamp"]
+        if self._watermark is None or ts > self._watermark:
+            self._watermark = ts
+        # partials started before the window can never complete; all branches
+        # of an origin share its start time, so they expire together
+        horizon = self._watermark - spec.window
+        while self._expiry and self._expiry[0][0] < horizon:
+            _, key, state, origin = heapq.heappop(self._expiry)
+            self._partials[state].remove(key)
+            self._origins.pop(origin, None)
+
+        action, coords = e["action"], e["coords"]
+        if action not in spec.actions or not coords:
+            return []
+        lat, lon = coords[0], coords[1]
+        fired = []
+        last = len(spec.steps) - 1
+        # walk states downwards so one event never advances the same match twice
+        for state in range(last, 0, -1):
+            step = spec.steps[state]
+            partials = self._partials[state]
+            if step.action != action or not len(partials):
+                continue
+            cands = [c for c in partials.nearby(lat, lon) if ts - c[3][1] <= spec.window and (step.max_gap is None or ts - c[3][2] <= step.max_gap)]
+            if not cands:
+                continue
+            mask = within_radius(lat, lon, [c[1] for c in cands], [c[2] for c in cands], step.radius)
+            matches = [c for c, ok in zip(cands, mask) if ok]
+            if not matches:
+                continue
+            if state == last:
+                # earliest pending match wins
+                origin, _, _, evidence = min(matches, key=lambda c: (c[3][0], c[0]))[3]
+                for s, key in self._origins.pop(origin, ()):
+                    self._partials[s].remove(key)
+                fired.append(_alert(spec.rule_id, "critical", [dict(evidence, **{step.evidence_key: e})]))
+            else:
+                # one new branch per origin: branches advanced by the same event
+                # would be indistinguishable from here on
+                advanced = set()
+                for _, _, _, (origin, start_ts, _, evidence) in sorted(matches, key=lambda c: c[0]):
+                    if origin not in advanced:
+                        advanced.add(origin)
+                        self._add(state + 1, origin, start_ts, ts, coords, dict(evidence, **{step.evidence_key: _step_record(step, e)}))
+
+        first = spec.steps[0]
+        if first.action == action:
+            self._add(1, None, ts, ts, coords, {first.evidence_key: _step_record(first, e)})
+        return fired
+
+
+def _step_record(step: "Step", e: Dict[str, Any]) -> Dict[str, Any]:
+    return {f"{step.action}_ts": e["timestamp"], "coords": e["coords"], "metadata": e.get("metadata", {})}
+
+
+class Step:
+    """One element of ``required_event_sequence``.
+
+    ``radius`` and ``max_gap`` constrain this step relative to the previous one.
+    """
+
+    def __init__(self, action: str, radius: float, max_gap: Optional[float], evidence_key: str):
+        self.action = action
+        self.radius = radius
+        self.max_gap = max_gap
+        self.evidence_key = evidence_key
+
+
+class SequenceSpec:
+    def __init__(self, rule_id: str, temporal: int, steps: List[Step]):
+        self.rule_id = rule_id
+        self.temporal = temporal
+        self.window = float(temporal)
+        self.steps = tuple(steps)
+        self.actions = frozenset(step.action for step in steps)
+
+    def matcher(self) -> SequenceMatcher:
+        return SequenceMatcher(self)
+
+
+def _compile_loiter(rule_json: Dict[str, Any]) -> Optional[LoiterSpec]:
+    """Parameters come from ``params`` ({"radius_m", "min_duration_s", "center"}) or
+    the top-level ``radius_m``/``zone_center``/``loiter_time_seconds`` keys."""
+    if rule_json.get("type") != "loiter":
+        return None
+    params = rule_json.get("params") or {}
+    if not isinstance(params, dict):
+        raise RuleCompileError(f"params must be an object, got {params!r}")
+    if "min_duration_s" in params:
+        loiter_sec = _number(params, "min_duration_s", 60)
+    else:
+        loiter_sec = _number(rule_json, "loiter_time_seconds", 60, int)
+    radius = None
+    source = params if "radius_m" in params else rule_json
+    if source.get("radius_m") is not None:
+        radius = _number(source, "radius_m", 0)
+        if radius <= 0:
+            raise RuleCompileError(f"radius_m must be > 0, got {radius!r}")
+    center = params.get("center", rule_json.get("zone_center"))
+    if center is not None:
+        if not (isinstance(center, (list, tuple)) and len(center) == 2 and all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in center)):
+            raise RuleCompileError(f"zone center must be [lat, lon], got {center!r}")
+        if radius is None:
+            raise RuleCompileError("a loiter zone center needs radius_m")
+        center = (float(center[0]), float(center[1]))
+    return LoiterSpec(loiter_sec, radius, center)
+
+
+def _compile_step(item: Any, index: int, radius: float, seen: set) -> Step:
+    """A step is an action name or {"action"|"event": name, "radius_meters"?, "within_seconds"?}."""
+    if isinstance(item, dict):
+        params = item
+        action = item.get("action") or item.get("event")
+    else:
+        params, action = {}, item
+    if not isinstance(action, str) or not action:
+        raise RuleCompileError(f"required_event_sequence[{index}] must name an action, got {item!r}")
+    radius = _number(params, "radius_meters", radius)
+    if radius <= 0:
+        raise RuleCompileError(f"required_event_sequence[{index}].radius_meters must be > 0, got {radius!r}")
+    max_gap = _number(params, "within_seconds", 0) if "within_seconds" in params else None
+    evidence_key = action if action not in seen else f"{action}_{index}"
+    seen.add(evidence_key)
+    return Step(action, radius, max_gap, evidence_key)
+
+
+def _compile_sequence(rule_json: Dict[str, Any]) -> Optional[SequenceSpec]:
+    sequence = rule_json.get("required_event_sequence")
+    if not (rule_json.get("rule_id") == "stateful_handoff_v2" or sequence):
+        return None
+    if sequence is None:
+        sequence = ["drop", "pickup"]
+    if not isinstance(sequence, (list, tuple)) or len(sequence) < 2:
+        raise RuleCompileError(f"required_event_sequence must list at least two steps, got {sequence!r}")
+    radius = _number(rule_json, "coords_radius_meters", 10)
+    if radius <= 0:
+        raise RuleCompileError(f"coords_radius_meters must be > 0, got {radius!r}")
+    seen: set = set()
+    return SequenceSpec(
+        rule_id=rule_json.get("rule_id", "stateful_handoff_v2"),
+        temporal=_number(rule_json, "temporal_window_seconds", 600, int),
+        steps=[_compile_step(item, i, radius, seen) for i, item in enumerate(sequence)],
+    )
+
+
+_DETECTORS: List[Callable[[Dict[str, Any]], Any]] = [_compile_loiter, _compile_sequence]
+
+
+def register_detector(compile_fn: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+    """Add a detector compiler; usable as a decorator. Clears the compiled-rule cache."""
+    _DETECTORS.append(compile_fn)
+    _compiled.clear()
+    return compile_fn
+
+
+class CompiledRule:
+    """Validated rule: parsed detector specs, shared across runs."""
+
+    def __init__(self, rule_json: Dict[str, Any], specs: List[Any]):
+        self.rule_json = rule_json
+        self.specs = tuple(specs)
+
+    def matchers(self) -> List[Any]:
+        return [spec.matcher() for spec in self.specs]
+
+
+def compile_rule(rule_json: Dict[str, Any]) -> CompiledRule:
+    if not isinstance(rule_json, dict):
+        raise RuleCompileError(f"rule_json must be an object, got {type(rule_json).__name__}")
+    specs = []
+    for compile_fn in _DETECTORS:
+        spec = compile_fn(rule_json)
+        if spec is not None:
+            specs.append(spec)
+    return CompiledRule(rule_json, specs)
+
+
+_compiled: "OrderedDict[str, CompiledRule]" = OrderedDict()
+
+
+def get_compiled_rule(rule_json: Dict[str, Any]) -> CompiledRule:
+    """``compile_rule`` memoized on the rule's content hash (bounded LRU)."""
+    key = rule_hash(rule_json)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = compile_rule(rule_json)
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_RULE_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(key)
+    return compiled
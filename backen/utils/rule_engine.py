@@ -1,30 +1,171 @@
 from typing import Dict, Any, List, Optional
-from backen.schemas import ScenarioModel, RunResultModel
-from math import radians, cos, sin, asin, sqrt
+from backen.schemas import EventModel, RunResultModel
+from backen.utils.rule_compiler import CompiledRule, get_compiled_rule
+from backen.utils.tracks import TrackStore
+from backen.utils.ingest import EventColumns, ScenarioColumns
 from datetime import datetime, timedelta
 import uuid
 
 
-def _haversine_meters(a: List[float], b: List[float]) -> float:
-    lat1, lon1 = a
-    lat2, lon2 = b
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    hav = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(hav))
-    R = 6371000
-    return R * c
+DEFAULT_RULE_JSON = {"type": "loiter", "loiter_time_seconds": 60, "zone": "Z"}
+
+
+def _offset(value: Any) -> float:
+    if value is None:
+        return 0
+    if type(value) is int or type(value) is float:
+        return value
+    return float(value)
+
+
+def _normalize_event(ev: Any) -> Dict[str, Any]:
+    """Engine view of an event; ``timestamp`` is the offset in seconds (int or float).
+
+    The engine only ever compares and subtracts offsets, so no datetimes are
+    built per event; evidence timestamps are offsets too (see ``anchor_alerts``).
+    """
+    if isinstance(ev, dict):
+        offset = ev.get("timestamp_offset_seconds")
+        if offset is None:
+            # fall back to 'timestamp' (assumed seconds offset in tests/sample data)
+            offset = ev.get("timestamp")
+        # support latitude/longitude fields
+        if "latitude" in ev or "longitude" in ev:
+            coords = [ev.get("latitude"), ev.get("longitude")]
+        else:
+            coords = ev.get("coords")
+        return {"entity_id": ev.get("entity_id"), "action": ev.get("action"), "coords": coords, "timestamp": _offset(offset), "metadata": ev.get("metadata") or {}}
+    # Pydantic EventModel (or any object with the same attributes)
+    return {
+        "entity_id": getattr(ev, "entity_id", None),
+        "action": getattr(ev, "action", None),
+        "coords": getattr(ev, "coords", None),
+        "timestamp": _offset(getattr(ev, "timestamp_offset_seconds", None)),
+        "metadata": getattr(ev, "metadata", None) or {},
+    }
+
+
+def _anchor(value: Any, epoch: datetime) -> Any:
+    if isinstance(value, list):
+        return [_anchor(v, epoch) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for k, v in value.items():
+        if (k == "timestamp" or k.endswith("_ts")) and type(v) in (int, float):
+            out[k] = epoch + timedelta(seconds=v)
+        elif k == "metadata":
+            # caller data; left as sent
+            out[k] = v
+        else:
+            out[k] = _anchor(v, epoch)
+    return out
+
+
+def anchor_alerts(alerts: List[Dict[str, Any]], epoch: datetime) -> List[Dict[str, Any]]:
+    """Copies of ``alerts`` whose evidence timestamps (``<action>_ts``, an event's
+    ``timestamp``) are datetimes relative to ``epoch`` instead of offsets."""
+    return [dict(a, evidence=_anchor(a["evidence"], epoch)) for a in alerts]
+
+
+class StreamingEvaluator:
+    """Incremental rule evaluator fed one event at a time.
+
+    Events are expected in (roughly) time order. ``push`` returns the alerts
+    fired by that event, so callers can react as soon as a rule matches.
+    The rule is compiled once per rule (see ``rule_compiler``); each evaluator
+    only owns the per-run matcher state. With ``epoch`` (the wall-clock time
+    of offset 0) the returned alerts carry datetimes instead of offsets; the
+    matchers themselves always work on offsets.
+    """
+
+    def __init__(self, rule_json: Optional[Dict[str, Any]] = None, epoch: Optional[datetime] = None):
+        if rule_json is None:
+            rule_json = DEFAULT_RULE_JSON
+        self.rule = rule_json if isinstance(rule_json, CompiledRule) else get_compiled_rule(rule_json)
+        self.rule_json = self.rule.rule_json
+        self.epoch = epoch
+        self.detected = False
+        self.event_count = 0
+        self._matchers = self.rule.matchers()
+
+    def push(self, ev: Any) -> List[Dict[str, Any]]:
+        """Feed a single event (EventModel or dict) and return any new alerts."""
+        fired = self._push_event(_normalize_event(ev))
+        if fired and self.epoch is not None:
+            return anchor_alerts(fired, self.epoch)
+        return fired
+
+    def push_many(self, events: Any) -> List[Dict[str, Any]]:
+        fired = []
+        for ev in events:
+            fired.extend(self.push(ev))
+        return fired
+
+    def _push_event(self, e: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.event_count += 1
+        fired = []
+        for matcher in self._matchers:
+            fired.extend(matcher.push(e))
+        if fired:
+            self.detected = True
+        return fired
+
+
+def _evaluate_events(rule: CompiledRule, events: Optional[List[Dict[str, Any]]], columns: Optional[EventColumns] = None) -> List[Dict[str, Any]]:
+    # track detectors run once over the time-sorted tracks; the rest stream
+    # through the events. Alerts are ordered by triggering event, then by spec,
+    # as StreamingEvaluator would emit them. With ``columns`` the normalized
+    # events are only built if a streaming detector needs them.
+    fired = []
+    streaming = [(pos, spec.matcher()) for pos, spec in enumerate(rule.specs) if not hasattr(spec, "detect")]
+    if streaming:
+        if events is None:
+            events = columns.normalized()
+        for i, e in enumerate(events):
+            for pos, matcher in streaming:
+                fired.extend((i, pos, a) for a in matcher.push(e))
+    tracks = None
+    for pos, spec in enumerate(rule.specs):
+        if hasattr(spec, "detect"):
+            if tracks is None:
+                if columns is not None:
+                    tracks = TrackStore.from_columns(columns.entity_id, columns.times, columns.lat, columns.lon)
+                else:
+                    tracks = TrackStore.from_events(events)
+            fired.extend((i, pos, a) for i, a in spec.detect(tracks))
+    fired.sort(key=lambda item: item[:2])
+    return [a for _, _, a in fired]
+
+
+def evaluate_events(raw_seq: Any, rule_json: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Alerts for a complete event sequence (EventColumns, or a list of EventModels or dicts)."""
+    rule = get_compiled_rule(rule_json if rule_json is not None else DEFAULT_RULE_JSON)
+    if isinstance(raw_seq, EventColumns):
+        return _evaluate_events(rule, None, raw_seq)
+    return _evaluate_events(rule, [_normalize_event(ev) for ev in raw_seq])
+
+
+def output_events(columns: EventColumns) -> List[EventModel]:
+    """``event_sequence`` of a run over ingested columns."""
+    # the events were validated at ingestion, so build the models without re-validating
+    return [
+        EventModel.construct(entity_id=e, entity_type=et or "unknown", action=a, timestamp_offset_seconds=ts, coords=c, metadata=m or {})
+        for e, et, a, ts, c, m in zip(columns.entity_id, columns.entity_type, columns.action, columns.t, columns.coords, columns.metadata)
+    ]
 
 
 def evaluate_scenario(scenario: Any, rule_json: Optional[Dict[str, Any]] = None) -> RunResultModel:
-    # Accept either a ScenarioModel or a plain dict
-    if rule_json is None:
-        rule_json = {"type": "loiter", "loiter_time_seconds": 60, "zone": "Z"}
+    rule = get_compiled_rule(rule_json if rule_json is not None else DEFAULT_RULE_JSON)
+    run_id = uuid.uuid4().hex
 
-    events = []
-    base = datetime.utcnow()
+    if isinstance(scenario, ScenarioColumns):
+        # validated at ingestion: no per-event normalization
+        columns = scenario.events
+        alerts = _evaluate_events(rule, None, columns)
+        return RunResultModel.construct(run_id=run_id, detected=bool(alerts), alerts=alerts, event_sequence=output_events(columns))
 
+    # Accept either a ScenarioModel or a plain dict
     raw_seq = []
     if hasattr(scenario, "event_sequence"):
         raw_seq = scenario.event_sequence
@@ -34,90 +175,19 @@ def evaluate_scenario(scenario: Any, rule_json: Optional[Dict[str, Any]] = None)
         # try to coerce
         raw_seq = []
 
-    for ev in raw_seq:
-        # ev may be a Pydantic model or a plain dict
-        if hasattr(ev, "timestamp_offset_seconds"):
-            offset = getattr(ev, "timestamp_offset_seconds")
-        else:
-            offset = ev.get("timestamp_offset_seconds") if isinstance(ev, dict) else None
-        if offset is None:
-            # fall back to 'timestamp' (assumed seconds offset in tests/sample data)
-            offset = ev.get("timestamp") if isinstance(ev, dict) else None
-        offset = int(offset) if offset is not None else 0
+    events = [_normalize_event(ev) for ev in raw_seq]
+    alerts = _evaluate_events(rule, events)
 
-        ts = base + timedelta(seconds=offset)
-
-        if hasattr(ev, "coords"):
-            coords = getattr(ev, "coords")
-        else:
-            # support latitude/longitude fields
-            if isinstance(ev, dict) and ("latitude" in ev or "longitude" in ev):
-                coords = [ev.get("latitude"), ev.get("longitude")]
-            else:
-                coords = ev.get("coords") if isinstance(ev, dict) else None
-
-        entity_id = getattr(ev, "entity_id") if hasattr(ev, "entity_id") else (ev.get("entity_id") if isinstance(ev, dict) else None)
-        action = getattr(ev, "action") if hasattr(ev, "action") else (ev.get("action") if isinstance(ev, dict) else None)
-        metadata = getattr(ev, "metadata") if hasattr(ev, "metadata") else (ev.get("metadata") if isinstance(ev, dict) else {})
-
-        events.append({"entity_id": entity_id, "action": action, "coords": coords, "timestamp": ts, "metadata": metadata or {}})
-
-    detected = False
-    alerts = []
-
-    # loiter detection
-    if rule_json.get("type") == "loiter":
-        loiter_sec = int(rule_json.get("loiter_time_seconds", 60))
-        times = {}
-        for e in events:
-            ent = e["entity_id"]
-            if ent not in times:
-                times[ent] = {"first": e["timestamp"], "last": e["timestamp"]}
-            else:
-                times[ent]["last"] = e["timestamp"]
-        for ent, t in times.items():
-            dur = (t["last"] - t["first"]).total_seconds()
-            if dur > loiter_sec:
-                detected = True
-                alerts.append({"alert_id": str(uuid.uuid4()), "rule_triggered": "loiter_v1", "evidence": [{"entity_id": ent, "duration": dur}]})
-
-    # stateful handoff
-    if rule_json.get("rule_id") == "stateful_handoff_v2" or rule_json.get("required_event_sequence"):
-        temporal = int(rule_json.get("temporal_window_seconds", 600))
-        radius = float(rule_json.get("coords_radius_meters", 10))
-        pending = []
-        for e in events:
-            if e["action"] == "drop":
-                pending.append({"drop_ts": e["timestamp"], "coords": e["coords"], "metadata": e.get("metadata", {})})
-            if e["action"] == "pickup":
-                matched = None
-                for p in pending:
-                    if (e["timestamp"] - p["drop_ts"]).total_seconds() <= temporal:
-                        dist = _haversine_meters(e["coords"], p["coords"])
-                        if dist <= radius:
-                            matched = p
-                            break
-                if matched:
-                    detected = True
-                    alerts.append({"alert_id": str(uuid.uuid4()), "rule_triggered": rule_json.get("rule_id", "stateful_handoff_v2"), "evidence": [{"drop": matched, "pickup": e}]})
-                    pending.remove(matched)
-
-    run_id = uuid.uuid4().hex
     # build EventModel-compatible output (timestamp_offset_seconds, action, coords)
     out_events = []
-    for i, e in enumerate(events):
-        offset_sec = 0
-        # attempt to recover offset from original raw_seq if present
-        raw = raw_seq[i] if i < len(raw_seq) else {}
-        if isinstance(raw, dict):
-            offset_sec = int(raw.get("timestamp_offset_seconds", raw.get("timestamp", 0) or 0))
+    for raw, e in zip(raw_seq, events):
         out_events.append({
-            "entity_id": e.get("entity_id"),
-            "entity_type": raw.get("entity_type") if isinstance(raw, dict) else "unknown",
-            "action": e.get("action") or "move",
-            "timestamp_offset_seconds": int(offset_sec),
-            "coords": e.get("coords"),
-            "metadata": e.get("metadata", {}),
+            "entity_id": e["entity_id"],
+            "entity_type": (raw.get("entity_type") if isinstance(raw, dict) else getattr(raw, "entity_type", None)) or "unknown",
+            "action": e["action"] or "move",
+            "timestamp_offset_seconds": int(e["timestamp"]),
+            "coords": e["coords"],
+            "metadata": e["metadata"],
         })
 
-    return RunResultModel(run_id=run_id, detected=detected, alerts=alerts, event_sequence=out_events)
+    return RunResultModel(run_id=run_id, detected=bool(alerts), alerts=alerts, event_sequence=out_events)
@@ -0,0 +1,37 @@
+"""Coalesce concurrent identical async calls into one in-flight call.
+
+``SingleFlight.run(key, fn)`` starts ``fn()`` as a task for the first caller
+of a key; callers arriving while it runs await the same task and share its
+result (or exception). The key is forgotten as soon as the task finishes, so
+later calls start a new one; caching finished results is a separate concern
+(see ``prompt_cache``). Callers await the task through ``asyncio.shield``: a
+cancelled caller (e.g. a closed browser tab) does not cancel the call the
+others are waiting on.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.started = 0
+        self.joined = 0
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.joined += 1
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,70 @@
+"""Lat/lon bucketed grid index for proximity lookups."""
+from typing import Any, Dict, Iterator, Tuple
+from math import cos, radians, floor, ceil, pi
+from backen.utils.geodesy import EARTH_RADIUS_M
+
+METERS_PER_DEG_LAT = EARTH_RADIUS_M * pi / 180.0
+_MIN_CELL_DEG = 1e-7
+
+
+class GridIndex:
+    """Buckets points into square lat/lon cells sized from a search radius.
+
+    Cells are ``radius_m`` tall in latitude, so any point within ``radius_m``
+    of a query lies in the query's row or one of its two neighbours. Columns
+    shrink towards the poles, so the number of neighbouring columns scanned
+    is widened by ``1 / cos(lat)`` at query time. Longitude wraps at ±180.
+    """
+
+    def __init__(self, radius_m: float):
+        self.radius_m = float(radius_m)
+        self.cell_deg = min(max(self.radius_m / METERS_PER_DEG_LAT, _MIN_CELL_DEG), 180.0)
+        self._ncols = max(1, int(ceil(360.0 / self.cell_deg)))
+        self._cells: Dict[Tuple[int, int], Dict[Any, Tuple[float, float, Any]]] = {}
+        self._where: Dict[Any, Tuple[int, int]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = int(floor((lat + 90.0) / self.cell_deg))
+        col = int(floor((lon + 180.0) / self.cell_deg)) % self._ncols
+        return row, col
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._where
+
+    def insert(self, key: Any, lat: float, lon: float, item: Any = None) -> None:
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[key] = (lat, lon, item)
+        self._where[key] = cell
+
+    def remove(self, key: Any) -> bool:
+        """Remove ``key`` if present; returns whether anything was removed."""
+        cell = self._where.pop(key, None)
+        if cell is None:
+            return False
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+        return True
+
+    def nearby(self, lat: float, lon: float) -> Iterator[Tuple[Any, float, float, Any]]:
+        """Yield ``(key, lat, lon, item)`` for every point in the cells that can
+        hold points within ``radius_m``. Callers still apply the exact distance test."""
+        row, col = self._cell(lat, lon)
+        c = max(cos(radians(min(abs(lat) + self.cell_deg, 90.0))), 1e-9)
+        span = min(int(ceil(1.0 / c)), self._ncols // 2 + 1)
+        seen_cols = set()
+        for dc in range(-span, span + 1):
+            cc = (col + dc) % self._ncols
+            if cc in seen_cols:
+                continue
+            seen_cols.add(cc)
+            for dr in (-1, 0, 1):
+                bucket = self._cells.get((row + dr, cc))
+                if not bucket:
+                    continue
+                for key, (plat, plon, item) in bucket.items():
+                    yield key, plat, plon, item
@@ -0,0 +1,25 @@
+"""HTTP framing for stream messages (see ``backen/utils/json_stream.py``).
+
+``streaming_response`` sends messages as NDJSON, or as server-sent events when
+the client accepts ``text/event-stream``.
+"""
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+
+async def ndjson_lines(messages: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for message in messages:
+        yield json.dumps(message).encode() + b"\n"
+
+
+async def sse_lines(messages: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for message in messages:
+        yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n".encode()
+
+
+def streaming_response(messages: AsyncIterator[Dict[str, Any]], accept: str = "") -> StreamingResponse:
+    if "text/event-stream" in accept:
+        return StreamingResponse(sse_lines(messages), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(ndjson_lines(messages), media_type="application/x-ndjson")
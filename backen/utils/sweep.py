@@ -0,0 +1,96 @@
+"""Parameter-grid sweeps of generated relay attacks against a rule.
+
+Each grid cell (drop delay, pickup delay, noise) is split into chunks that
+generate and evaluate their variants inside a worker process, so only the
+detection counts cross the process boundary.
+"""
+import os
+import random
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backen.utils.attack_scenarios import generate_variants
+from backen.utils.parallel import EVAL_WORKERS
+from backen.utils.rule_engine import StreamingEvaluator
+
+# variants generated and evaluated per worker task
+SWEEP_CHUNK = 500
+# upper bound on variants accepted through the API
+SWEEP_MAX_VARIANTS = int(os.getenv("SWEEP_MAX_VARIANTS", "1000000"))
+
+
+def build_grid(drop_delays: Sequence[int], pickup_delays: Sequence[int], noises: Sequence[float]) -> List[Dict[str, Any]]:
+    return [
+        {"drop_delay_seconds": int(d), "pickup_delay_seconds": int(p), "noise_m": float(n)}
+        for d, p, n in product(drop_delays, pickup_delays, noises)
+    ]
+
+
+def _run_chunk(task: Tuple[int, Dict[str, Any], int, Dict[str, Any], int]) -> Tuple[int, int, int]:
+    cell_idx, cell, n, rule_json, seed = task
+    random.seed(seed)
+    detected = 0
+    for scenario in generate_variants(n, **cell):
+        ev = StreamingEvaluator(rule_json)
+        ev.push_many(scenario.event_sequence)
+        if ev.detected:
+            detected += 1
+    return cell_idx, n, detected
+
+
+def _tasks(grid: List[Dict[str, Any]], variants_per_cell: int, rule_json: Dict[str, Any], seed: int):
+    task_no = 0
+    for cell_idx, cell in enumerate(grid):
+        remaining = variants_per_cell
+        while remaining > 0:
+            n = min(SWEEP_CHUNK, remaining)
+            remaining -= n
+            yield (cell_idx, cell, n, rule_json, seed + task_no)
+            task_no += 1
+
+
+def run_sweep(rule_json: Optional[Dict[str, Any]], grid: List[Dict[str, Any]], variants_per_cell: int = 100, workers: Optional[int] = None, executor: Optional[Executor] = None, seed: int = 0) -> Dict[str, Any]:
+    """Evaluate ``variants_per_cell`` generated attacks for every grid cell.
+
+    Uses ``executor`` when given, otherwise a ProcessPoolExecutor with
+    ``workers`` processes (default: all cores). Returns per-cell detection and
+    bypass rates plus overall totals.
+    """
+    tasks = list(_tasks(grid, variants_per_cell, rule_json, seed))
+    own = executor is None
+    if own:
+        executor = ProcessPoolExecutor(max_workers=workers or EVAL_WORKERS)
+    try:
+        chunksize = max(1, len(tasks) // ((workers or EVAL_WORKERS) * 4))
+        outcomes = list(executor.map(_run_chunk, tasks, chunksize=chunksize))
+    finally:
+        if own:
+            executor.shutdown()
+
+    totals = [[0, 0] for _ in grid]
+    for cell_idx, n, detected in outcomes:
+        totals[cell_idx][0] += n
+        totals[cell_idx][1] += detected
+
+    cells = []
+    for cell, (n, detected) in zip(grid, totals):
+        row = dict(cell)
+        row.update({
+            "variants": n,
+            "detected": detected,
+            "bypassed": n - detected,
+            "detection_rate": detected / n if n else 0.0,
+            "bypass_rate": (n - detected) / n if n else 0.0,
+        })
+        cells.append(row)
+
+    total = sum(c["variants"] for c in cells)
+    detected = sum(c["detected"] for c in cells)
+    return {
+        "cells": cells,
+        "variants": total,
+        "detected": detected,
+        "detection_rate": detected / total if total else 0.0,
+        "bypass_rate": (total - detected) / total if total else 0.0,
+    }
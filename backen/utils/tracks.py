@@ -0,0 +1,162 @@
+"""Per-entity tracks as time-sorted NumPy columns.
+
+``TrackStore.from_events`` groups normalized events by ``entity_id`` once and
+sorts each group by time (stable, so ties keep input order). Track rules
+(loiter, dwell, speed) query these arrays instead of rescanning event dicts.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backen.utils.geodesy import distance_meters, distances_to_many, segment_lengths
+
+
+class Track:
+    """One entity's events: ``t`` (seconds offsets; int64, or float64 when any
+    offset is fractional), ``lat``/``lon`` (float64, NaN when an event has no
+    coords) and ``index`` (position in the input sequence)."""
+
+    __slots__ = ("entity_id", "t", "lat", "lon", "index")
+
+    def __init__(self, entity_id: Any, t: np.ndarray, lat: np.ndarray, lon: np.ndarray, index: np.ndarray):
+        self.entity_id = entity_id
+        self.t = t
+        self.lat = lat
+        self.lon = lon
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @property
+    def first(self) -> float:
+        return self.t[0].item()
+
+    @property
+    def last(self) -> float:
+        return self.t[-1].item()
+
+    @property
+    def dwell(self) -> float:
+        """Seconds between the earliest and latest sample."""
+        return (self.t[-1] - self.t[0]).item()
+
+    def elapsed(self) -> np.ndarray:
+        """Seconds since the first sample, per sample."""
+        return self.t - self.t[0]
+
+    def speeds(self) -> np.ndarray:
+        """Metres per second over each step (NaN where two samples share a timestamp)."""
+        dist = segment_lengths(self.lat, self.lon)
+        dt = np.diff(self.t).astype(np.float64)
+        out = np.full(len(dist), np.nan)
+        np.divide(dist, dt, out=out, where=dt > 0)
+        return out
+
+    def max_speed(self) -> float:
+        speeds = self.speeds()
+        return float(np.nanmax(speeds)) if len(speeds) and not np.isnan(speeds).all() else 0.0
+
+    def zone_dwell(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Cumulative seconds spent within ``radius_m`` of (lat, lon), per sample.
+
+        A step counts when both of its samples are inside; samples without
+        coords count as outside.
+        """
+        inside = distances_to_many(lat, lon, self.lat, self.lon, radius_m) <= radius_m
+        both = inside[1:] & inside[:-1]
+        return np.concatenate(([0], np.cumsum(np.diff(self.t) * both)))
+
+    def anchored_dwell_crossing(self, radius_m: float, min_duration_s: float) -> Optional[Tuple[int, int]]:
+        """First sample whose continuous dwell near its anchor exceeds ``min_duration_s``.
+
+        The anchor is the first sample; a sample more than ``radius_m`` from the
+        anchor becomes the new anchor. Returns (sample, anchor) positions within
+        the track, or None. Samples without coords are skipped.
+
+        Each anchor only looks ahead to the first sample past the threshold,
+        a few samples at a time and then in blocks that double in size, so
+        every sample's distance is computed a bounded number of times: O(n)
+        per track.
+        """
+        valid = np.flatnonzero(~np.isnan(self.lat))
+        t, lat, lon = self.t[valid], self.lat[valid], self.lon[valid]
+        n = len(t)
+        lat_l, lon_l = lat.tolist(), lon.tolist()
+        a = 0
+        while a < n:
+            # first sample whose dwell from this anchor would exceed the threshold;
+            # later anchors start later, so if there is none we are done
+            end = int(np.searchsorted(t, t[a] + min_duration_s, side="right"))
+            if end >= n:
+                return None
+            # moving tracks re-anchor within a few samples: check those with the
+            # scalar kernel before paying for vectorized blocks
+            lo, block, away = a + 1, 16, None
+            stop = min(end, a + 8)
+            while lo <= stop:
+                if distance_meters(lat_l[a], lon_l[a], lat_l[lo], lon_l[lo], radius_m) > radius_m:
+                    away = lo
+                    break
+                lo += 1
+            while away is None and lo <= end:
+                hi = min(lo + block, end + 1)
+                out = np.flatnonzero(distances_to_many(lat[a], lon[a], lat[lo:hi], lon[lo:hi], radius_m) > radius_m)
+                if len(out):
+                    away = lo + int(out[0])
+                    break
+                lo, block = hi, block * 2
+            if away is None:
+                return int(valid[end]), int(valid[a])
+            a = away
+        return None
+
+
+class TrackStore:
+    def __init__(self, tracks: Dict[Any, Track]):
+        self._tracks = tracks
+
+    @classmethod
+    def from_events(cls, events: List[Dict[str, Any]]) -> "TrackStore":
+        """Build from normalized events (``timestamp`` as a seconds offset)."""
+        n = len(events)
+        t = np.array([e["timestamp"] for e in events])
+        if not np.issubdtype(t.dtype, np.number):
+            t = t.astype(np.float64)
+        lat = np.full(n, np.nan)
+        lon = np.full(n, np.nan)
+        for i, e in enumerate(events):
+            coords = e.get("coords")
+            if coords and coords[0] is not None and coords[1] is not None:
+                lat[i], lon[i] = coords[0], coords[1]
+        return cls.from_columns([e["entity_id"] for e in events], t, lat, lon)
+
+    @classmethod
+    def from_columns(cls, entity_ids: List[Any], t: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> "TrackStore":
+        """Build from parallel columns in input order (see ``ingest.EventColumns``)."""
+        groups: Dict[Any, List[int]] = {}
+        for i, entity_id in enumerate(entity_ids):
+            groups.setdefault(entity_id, []).append(i)
+
+        tracks = {}
+        for entity_id, positions in groups.items():
+            idx = np.asarray(positions, dtype=np.int64)
+            idx = idx[np.argsort(t[idx], kind="stable")]
+            tracks[entity_id] = Track(entity_id, t[idx], lat[idx], lon[idx], idx)
+        return cls(tracks)
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __iter__(self) -> Iterator[Track]:
+        return iter(self._tracks.values())
+
+    def __getitem__(self, entity_id: Any) -> Track:
+        return self._tracks[entity_id]
+
+    def __contains__(self, entity_id: Any) -> bool:
+        return entity_id in self._tracks
+
+    @property
+    def entities(self) -> List[Any]:
+        return list(self._tracks)
@@ -1,14 +1,35 @@
 """Database setup using SQLAlchemy."""
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from backen.storage_profiles import engine_options, install_pragmas
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator, Iterable, Dict, Any
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./relay.db")
+# rows per executemany round trip when bulk-inserting event logs
+EVENT_INSERT_BATCH = int(os.getenv("EVENT_INSERT_BATCH", "1000"))
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# pragmas and pool settings come from the DB_PROFILE storage profile
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+install_pragmas(engine, DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
+# async drivers for the sync URL schemes we support; override with ASYNC_DATABASE_URL
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+install_pragmas(async_engine.sync_engine, ASYNC_DATABASE_URL)
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 
 def get_db() -> Generator:
     db = SessionLocal()
@@ -18,8 +39,38 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator:
+    """Async counterpart of ``get_db`` for routes that must not block the event loop.
+
+    Sync helpers (``bulk_insert``, the active-rule cache) run via ``db.run_sync``.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def create_tables():
-    """Create all tables from models. Import models here to ensure metadata is registered."""
-    from models import Base
+    """Create or upgrade the schema. Called once at startup and by scripts/create_db.py."""
+    from migrations import upgrade
+
+    upgrade(engine)
+
+
+def bulk_insert(db, model, rows: Iterable[Dict[str, Any]], batch_size: int = EVENT_INSERT_BATCH) -> int:
+    """Insert plain-dict rows through Core executemany in batches of ``batch_size``.
 
-    Base.metadata.create_all(bind=engine)
+    Runs inside the session's current transaction; the caller commits.
+    Returns the number of rows inserted.
+    """
+    stmt = model.__table__.insert()
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(stmt, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.execute(stmt, batch)
+        count += len(batch)
+    return count
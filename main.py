@@ -3,6 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 from routes import simulation, ai_engine
+from database import create_tables
+from backen.services.http_client import start_client, close_client
+from backen.utils.parallel import shutdown_process_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("relay_backend")
@@ -26,6 +29,29 @@ app.include_router(simulation.router, prefix="/simulate", tags=["simulate"])
 app.include_router(ai_engine.router, prefix="/ai", tags=["ai"])
 
 
+@app.on_event("startup")
+def apply_migrations():
+    """Create/upgrade the schema once per process instead of on every request."""
+    create_tables()
+
+
+@app.on_event("startup")
+async def open_http_client():
+    """One pooled HTTP client for all Gemini calls, reused across requests."""
+    await start_client()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await close_client()
+
+
+@app.on_event("shutdown")
+def stop_process_pool():
+    """Join the rule-evaluation worker processes so none outlive the server."""
+    shutdown_process_pool()
+
+
 @app.get("/")
 async def root():
     """Health check
@@ -0,0 +1,56 @@
+"""Versioned schema migrations for the root app (see backen/migrations.py for the runner)."""
+from typing import List
+
+from sqlalchemy import text
+
+from backen.migrations import Migration, run_migrations, create_index_if_missing, add_column_if_missing
+
+
+def _initial_schema(conn):
+    from models import Base
+
+    Base.metadata.create_all(bind=conn)
+
+
+def _summary_columns(conn):
+    for column, ddl in (("detected", "BOOLEAN"), ("alert_count", "INTEGER"), ("event_count", "INTEGER"), ("bypassed_events_count", "INTEGER"), ("duration_ms", "FLOAT")):
+        add_column_if_missing(conn, "simulation_runs", column, ddl)
+    conn.execute(text(
+        "UPDATE simulation_runs SET "
+        "detected = json_extract(result_summary, '$.detected'), "
+        "alert_count = json_array_length(result_summary, '$.alerts'), "
+        "event_count = json_extract(result_summary, '$.event_count'), "
+        "bypassed_events_count = COALESCE(json_extract(result_summary, '$.bypassed_events_count'), 0) "
+        "WHERE detected IS NULL AND result_summary IS NOT NULL"
+    ))
+    create_index_if_missing(conn, "ix_simulation_runs_detected", "simulation_runs", "detected")
+    create_index_if_missing(conn, "ix_simulation_runs_rule_id_created_at", "simulation_runs", "rule_id, created_at")
+
+
+def _result_cache_table(conn):
+    from models import CachedResult
+
+    CachedResult.__table__.create(bind=conn, checkfirst=True)
+
+
+def _ai_generated_table(conn):
+    from models import AIGeneratedScenario
+
+    AIGeneratedScenario.__table__.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "initial schema", _initial_schema),
+    (2, "simulation_runs (created_at, id) index", lambda conn: create_index_if_missing(conn, "ix_simulation_runs_created_at_id", "simulation_runs", "created_at, id")),
+    (3, "simulation_runs summary columns", _summary_columns),
+    (4, "result_cache table", _result_cache_table),
+    (5, "ai_generated table", _ai_generated_table),
+    (6, "result_cache created_at index", lambda conn: create_index_if_missing(conn, "ix_result_cache_created_at", "result_cache", "created_at")),
+]
+
+
+def upgrade(engine=None) -> int:
+    """Bring the database up to the latest schema version."""
+    if engine is None:
+        from database import engine
+    return run_migrations(engine, MIGRATIONS)
@@ -1,6 +1,6 @@
 """SQLAlchemy models for rules, events, patches, and simulation runs."""
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, Float
 from sqlalchemy.types import JSON
 from sqlalchemy.sql import func
 import uuid
@@ -22,6 +22,13 @@ class Rule(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class RuleState(Base):
+    """Single-row counter bumped whenever the active rule changes."""
+    __tablename__ = "rule_state"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 class EventLog(Base):
     __tablename__ = "event_logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -49,8 +56,37 @@ class Patch(Base):
 
 class SimulationRun(Base):
     __tablename__ = "simulation_runs"
+    # backs keyset pagination of GET /simulate/logs
+    __table_args__ = (
+        Index("ix_simulation_runs_created_at_id", "created_at", "id"),
+        Index("ix_simulation_runs_rule_id_created_at", "rule_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(String, unique=True, index=True, nullable=False)
     rule_id = Column(String, ForeignKey("rules.rule_id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     result_summary = Column(JSON)
+    # denormalized from result_summary on write so analytics can aggregate in SQL
+    detected = Column(Boolean, index=True)
+    alert_count = Column(Integer)
+    event_count = Column(Integer)
+    bypassed_events_count = Column(Integer)
+    duration_ms = Column(Float)
+
+
+class AIGeneratedScenario(Base):
+    """Cached Gemini response keyed by prompt hash in ``scenario_id`` (see backen/utils/prompt_cache.py)."""
+    __tablename__ = "ai_generated"
+    id = Column(Integer, primary_key=True, index=True)
+    scenario_id = Column(String, unique=True, index=True, nullable=False)
+    scenario_json = Column(JSON)
+    raw_ai_output = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class CachedResult(Base):
+    """Stored run result keyed by 'v<engine version>:<scenario hash>:<rule hash>' (see utils/result_cache.py)."""
+    __tablename__ = "result_cache"
+    key = Column(String, primary_key=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
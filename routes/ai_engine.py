@@ -1,7 +1,11 @@
 """AI Engine routes that integrate with Gemini to generate red-team scenarios and blue-team patches."""
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, Query, Request
 from typing import Optional, Any, Dict
-from services.gemini_client import call_gemini
+from services.gemini_client import call_gemini, stream_gemini
+from backen.services.http_client import RED_TEAM_TIMEOUT, BLUE_TEAM_TIMEOUT
+from backen.utils.prompt_cache import cache_bypassed
+from backen.utils.streaming import streaming_response
+from backen.utils.json_stream import scenario_messages
 from schemas import GeminiResponse, ScenarioModel, PatchModel, RunResultModel, RuleModel
 from utils.attack_scenarios import generate_relay_attack
 import json
@@ -31,16 +35,27 @@ Return JSON with keys: patch_json, justification
 
 
 @router.post("/red_team")
-async def red_team(rule_text: Optional[str] = Body(None), rule_json: Optional[dict] = Body(None)) -> Dict[str, Any]:
+async def red_team(request: Request, rule_text: Optional[str] = Body(None), rule_json: Optional[dict] = Body(None), stream: bool = Query(False)) -> Dict[str, Any]:
     """Generate a red-team scenario using Gemini. Falls back to a local generator if no API key or Gemini fails.
 
+    Identical prompts are served from the AI response cache; send the header
+    ``X-AI-Cache: bypass`` to force a fresh Gemini call.
+
+    With ``?stream=true`` the scenario is streamed: one ``event`` message per
+    event as soon as it parses and validates, then a ``scenario`` message with
+    scenario_id/description. NDJSON by default, server-sent events when the
+    request sends ``Accept: text/event-stream``.
+
     Request examples:
       { "rule_text": "loiter_v1..." }
 
     Response: scenario JSON
     """
     prompt = RED_TEAM_PROMPT.format(rule=rule_text or json.dumps(rule_json or {}))
-    ai_resp = await call_gemini(prompt)
+    if stream:
+        chunks = stream_gemini(prompt, timeout=RED_TEAM_TIMEOUT, use_cache=not cache_bypassed(request.headers))
+        return streaming_response(scenario_messages(chunks, generate_relay_attack), request.headers.get("accept", ""))
+    ai_resp = await call_gemini(prompt, timeout=RED_TEAM_TIMEOUT, use_cache=not cache_bypassed(request.headers))
     # best-effort parse
     if not ai_resp.get("success"):
         # fallback to local generator
@@ -61,14 +76,14 @@ async def red_team(rule_text: Optional[str] = Body(None), rule_json: Optional[di
 
 
 @router.post("/blue_team")
-async def blue_team(attack_log: dict = Body(...), current_rule: dict = Body(...)) -> Dict[str, Any]:
-    """Ask Gemini for a patch given an attack log and current rule.
+async def blue_team(request: Request, attack_log: dict = Body(...), current_rule: dict = Body(...)) -> Dict[str, Any]:
+    """Ask Gemini for a patch given an attack log and current rule (cached like ``red_team``).
 
     Returns: { patch_json, justification, raw_ai_output }
     """
     prompt = BLUE_TEAM_PROMPT
     prompt = prompt + "\nCurrent rule: " + json.dumps(current_rule) + "\nAttack log: " + json.dumps(attack_log)
-    ai_resp = await call_gemini(prompt)
+    ai_resp = await call_gemini(prompt, timeout=BLUE_TEAM_TIMEOUT, use_cache=not cache_bypassed(request.headers))
     if not ai_resp.get("success"):
         return {"patch_json": None, "justification": "AI unavailable, fallback required", "raw_ai_output": ai_resp}
     content = ai_resp.get("content")
@@ -1,22 +1,50 @@
 """Simulation routes: run simulations, apply patches, retrieve logs."""
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
 from typing import Optional, List, Any
-from database import get_db, create_tables
-from sqlalchemy.orm import Session
+from functools import partial
+from database import get_async_db, bulk_insert
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.gemini_client import call_gemini
 from utils.attack_scenarios import generate_relay_attack
 from utils.rule_engine import evaluate_scenario
-from models import Rule, SimulationRun, EventLog, Patch
-from schemas import ScenarioModel, RunResultModel, RuleModel, PatchModel
+from models import Rule, RuleState, SimulationRun, EventLog, Patch, CachedResult
+from schemas import EventModel, ScenarioModel, RunResultModel, RuleModel, PatchModel
+from backen.utils.parallel import parallel_map_async, run_off_loop, Timed
+from backen.utils.analytics import rule_metrics_stmt, format_rule_metrics
+from backen.utils.rule_cache import ActiveRuleCache
+from backen.utils.result_cache import ResultCache, cache_key, strip_alert_ids, with_fresh_alert_ids
+from backen.utils.rule_compiler import RuleCompileError, get_compiled_rule
+from backen.utils.ingest import IngestError, ScenarioColumns, loads
+from backen.utils.pagination import encode_cursor, keyset_page, parse_fields, raw_column
+from backen.utils.responses import trusted_response
 import uuid
 import logging
 
 router = APIRouter()
 logger = logging.getLogger("simulation_routes")
 
+active_rule_cache = ActiveRuleCache(Rule, RuleState, build=lambda r, version: RuleModel(rule_id=r.rule_id, rule_json=r.rule_json, description=r.description, active=r.active))
+result_cache = ResultCache(CachedResult)
+
+# columns selectable through GET /logs?fields=...
+LOG_FIELDS = {
+    "run_id": SimulationRun.run_id,
+    "rule_id": SimulationRun.rule_id,
+    "created_at": SimulationRun.created_at,
+    "detected": SimulationRun.detected,
+    "alert_count": SimulationRun.alert_count,
+    "event_count": SimulationRun.event_count,
+    "bypassed_events_count": SimulationRun.bypassed_events_count,
+    "duration_ms": SimulationRun.duration_ms,
+    "result_summary": SimulationRun.result_summary,
+}
+LOG_FIELD_PRESETS = {"summary": ["run_id", "rule_id", "created_at", "detected", "alert_count", "event_count"]}
+
 
 @router.post("/run", response_model=RunResultModel)
-async def run_simulation(scenario: Optional[Any] = Body(None), db: Session = Depends(get_db)):
+async def run_simulation(request: Request, use_cache: bool = Query(True), db: AsyncSession = Depends(get_async_db)):
     """Run a simulation against the active rule.
 
     If scenario is omitted, a generated relay attack will be used.
@@ -24,52 +52,160 @@ async def run_simulation(scenario: Optional[Any] = Body(None), db: Session = Dep
     Sample request: {}
     Sample response: RunResultModel
     """
-    # Ensure tables
-    create_tables()
+    # validated straight into columns (see backen/utils/ingest.py), no per-event models
+    scenario = await _read_scenario(request)
 
-    # Accept either omitted body or an empty object as 'generate a scenario'
-    if not scenario:
-        scenario = generate_relay_attack()
-    else:
-        # If the client sent a dict, try to coerce into ScenarioModel
-        if not isinstance(scenario, ScenarioModel):
-            try:
-                scenario = ScenarioModel.parse_obj(scenario)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
-
-    # load active rule
-    active_rule = db.query(Rule).filter(Rule.active == True).first()
-    if active_rule:
-        rule_model = RuleModel(rule_id=active_rule.rule_id, rule_json=active_rule.rule_json, description=active_rule.description, active=active_rule.active)
-    else:
-        rule_model = None
+    # load active rule (cached until apply_patch bumps the rule version)
+    rule_model = await db.run_sync(active_rule_cache.get)
 
-    result = evaluate_scenario(scenario, rule_model)
+    # identical event sequences under an unchanged rule reuse the stored result
+    key = cache_key(scenario.event_sequence, rule_model.rule_json if rule_model else None)
+    cached = await db.run_sync(result_cache.get, key) if use_cache else None
+    if cached is not None:
+        # cached payloads were produced by the engine, so they are not re-validated
+        result, duration_ms = RunResultModel.construct(**dict(with_fresh_alert_ids(cached), scenario=scenario.to_model(ScenarioModel, EventModel))), None
+    else:
+        result, duration_ms = await run_off_loop(Timed(partial(evaluate_scenario, rule=rule_model)), scenario, len(scenario.events))
+        if use_cache:
+            await db.run_sync(result_cache.put, key, strip_alert_ids(jsonable_encoder(result, exclude={"scenario"})))
 
-    # persist run
+    # persist run and events in a single transaction
     run_id = f"run_{uuid.uuid4().hex[:8]}"
-    sim = SimulationRun(run_id=run_id, rule_id=rule_model.rule_id if rule_model else None, result_summary=result.dict())
+    sim = SimulationRun(run_id=run_id, rule_id=rule_model.rule_id if rule_model else None, **_summary_columns(result, duration_ms))
     db.add(sim)
-    db.commit()
+    await db.run_sync(bulk_insert, EventLog, _event_rows(scenario))
+    await db.commit()
+
+    return trusted_response(result)
+
+
+def _summary_columns(result: RunResultModel, duration_ms: Optional[float]) -> dict:
+    return {
+        "result_summary": jsonable_encoder(result),
+        "detected": result.detected,
+        "alert_count": len(result.alerts),
+        "event_count": result.event_count,
+        "bypassed_events_count": result.bypassed_events_count,
+        # NULL for cache hits, so AVG(duration_ms) only covers real evaluations
+        "duration_ms": duration_ms,
+    }
+
+
+def _event_rows(scenario: ScenarioColumns):
+    ev = scenario.events
+    for idx, (entity_id, entity_type, action, coords, meta) in enumerate(zip(ev.entity_id, ev.entity_type, ev.action, ev.coords, ev.metadata)):
+        yield {"scenario_id": scenario.scenario_id, "event_index": idx, "entity_id": entity_id, "entity_type": entity_type, "action": action, "coords": coords, "meta": meta or {}, "result": None}
+
+
+async def _read_scenario(request: Request) -> ScenarioColumns:
+    # an omitted body or an empty object means 'generate a scenario'
+    body = await request.body()
+    try:
+        payload = loads(body) if body.strip() else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
+    if not payload:
+        return ScenarioColumns.from_model(generate_relay_attack())
+    try:
+        return ScenarioColumns.parse(payload, ScenarioModel)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario payload: {e}")
+
+
+async def _read_batch_payload(request: Request) -> List[Any]:
+    """Read a batch body: a JSON array, {"scenarios": [...]}, or NDJSON (one scenario per line)."""
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            return [loads(line) for line in body.splitlines() if line.strip()]
+        payload = loads(body or b"[]")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch payload: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get("scenarios", [])
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Batch payload must be a list of scenarios")
+    return payload
+
+
+@router.post("/run_batch")
+async def run_simulation_batch(request: Request, use_cache: bool = Query(True), db: AsyncSession = Depends(get_async_db)):
+    """Run many scenarios against the active rule in one request.
+
+    Accepts a JSON array of ScenarioModel payloads (or {"scenarios": [...]}), or an
+    application/x-ndjson body with one scenario per line. The active rule is loaded
+    once, scenarios are evaluated across the process pool, and runs and events are
+    written with bulk inserts in a single transaction. Scenarios found in the result
+    cache are not re-evaluated; pass use_cache=false to force evaluation.
+
+    Sample response: {"results": [RunResultModel, ...], "count": 2, "detected_count": 1}
+    """
+
+    payload = await _read_batch_payload(request)
+    scenarios = []
+    for idx, item in enumerate(payload):
+        try:
+            scenarios.append(ScenarioColumns.parse(item, ScenarioModel))
+        except IngestError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid scenario payload at index {idx}: {e}")
+
+    rule_model = await db.run_sync(active_rule_cache.get)
+
+    timed = await _evaluate_cached(db, scenarios, rule_model, use_cache)
+    results = [result for result, _ in timed]
+
+    runs = [dict(run_id=f"run_{uuid.uuid4().hex[:8]}", rule_id=rule_model.rule_id if rule_model else None, **_summary_columns(result, ms)) for result, ms in timed]
+    await db.run_sync(bulk_insert, SimulationRun, runs)
+    await db.run_sync(bulk_insert, EventLog, (row for scenario in scenarios for row in _event_rows(scenario)))
+    await db.commit()
+
+    return trusted_response({"results": results, "count": len(results), "detected_count": sum(1 for r in results if r.detected)})
+
+
+async def _evaluate_cached(db: AsyncSession, scenarios: List[ScenarioColumns], rule_model: Optional[RuleModel], use_cache: bool):
+    """(result, duration_ms) per scenario; cache hits have no duration (None) and only misses hit the pool."""
+    evaluate = Timed(partial(evaluate_scenario, rule=rule_model))
+    if not use_cache:
+        return await parallel_map_async(evaluate, scenarios)
+
+    keys = [cache_key(scenario.event_sequence, rule_model.rule_json if rule_model else None) for scenario in scenarios]
+    cached = await db.run_sync(result_cache.get_many, keys)
+    # identical scenarios within one batch are evaluated once
+    todo = {}
+    for key, scenario in zip(keys, scenarios):
+        if key not in cached and key not in todo:
+            todo[key] = scenario
+    fresh = dict(zip(todo, await parallel_map_async(evaluate, list(todo.values()))))
+    payloads = dict(cached)
+    payloads.update((key, strip_alert_ids(jsonable_encoder(result, exclude={"scenario"}))) for key, (result, _) in fresh.items())
+    if fresh:
+        await db.run_sync(result_cache.put_many, {key: payloads[key] for key in fresh})
 
-    # persist events
-    for idx, ev in enumerate(scenario.event_sequence):
-        log = EventLog(scenario_id=scenario.scenario_id, event_index=idx, entity_id=ev.entity_id, entity_type=ev.entity_type, action=ev.action, coords=ev.coords, meta=ev.metadata or {}, result=None)
-        db.add(log)
-    db.commit()
+    timed = []
+    for key, scenario in zip(keys, scenarios):
+        if key in fresh:
+            timed.append(fresh.pop(key))
+        else:
+            timed.append((RunResultModel.construct(**dict(with_fresh_alert_ids(payloads[key]), scenario=scenario.to_model(ScenarioModel, EventModel))), None))
+    return timed
 
-    return result
+
+def _validate_rule(rule_json) -> None:
+    try:
+        get_compiled_rule(rule_json)
+    except RuleCompileError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule: {e}")
 
 
 @router.post("/apply_patch", response_model=RuleModel)
-async def apply_patch(patch: PatchModel, db: Session = Depends(get_db)):
+async def apply_patch(patch: PatchModel, db: AsyncSession = Depends(get_async_db)):
     """Apply a patch (blue team) - persists patch and activates the corresponding rule.
 
     Request: PatchModel
     Response: activated RuleModel
     """
-    create_tables()
+    # reject rules the engine cannot compile before they become active
+    _validate_rule(patch.patch_json or {})
     patch_id = patch.patch_id or f"patch_{uuid.uuid4().hex[:8]}"
     # create patch
     p = Patch(patch_id=patch_id, patch_json=patch.patch_json or {}, description=patch.description)
@@ -78,16 +214,55 @@ async def apply_patch(patch: PatchModel, db: Session = Depends(get_db)):
     # create/activate new rule
     rule_id = patch.patch_json.get("rule_id") if patch.patch_json else f"rule_{uuid.uuid4().hex[:8]}"
     # deactivate other rules
-    db.query(Rule).update({Rule.active: False})
+    await db.execute(update(Rule).values(active=False))
     new_rule = Rule(rule_id=rule_id, rule_json=patch.patch_json or {}, description=patch.description or "Applied patch", active=True)
     db.add(new_rule)
-    db.commit()
+    await db.run_sync(active_rule_cache.bump)
+    await db.commit()
     return RuleModel(rule_id=new_rule.rule_id, rule_json=new_rule.rule_json, description=new_rule.description, active=new_rule.active)
 
 
 @router.get("/logs")
-async def get_logs(limit: int = Query(20, ge=1, le=200), offset: int = 0, db: Session = Depends(get_db)):
-    """Return past simulation runs with pagination."""
-    create_tables()
-    runs = db.query(SimulationRun).order_by(SimulationRun.created_at.desc()).limit(limit).offset(offset).all()
-    return {"runs": [r.result_summary for r in runs], "count": len(runs)}
+async def get_logs(
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Return past simulation runs, newest first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to fetch the next page
+    (keyset pagination on ``(created_at, id)``); ``offset`` is only honoured
+    without a cursor. ``fields=summary`` (or a comma list of LOG_FIELDS)
+    returns compact rows instead of the full ``result_summary`` blobs.
+    """
+    try:
+        names = parse_fields(fields, LOG_FIELDS, LOG_FIELD_PRESETS)
+        stmt = select(SimulationRun.id, raw_column(SimulationRun.created_at, "cursor_created"), *[LOG_FIELDS[n].label(n) for n in (names or ["result_summary"])])
+        stmt = keyset_page(stmt, SimulationRun.created_at, SimulationRun.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if offset and not cursor:
+        stmt = stmt.offset(offset)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].cursor_created, rows[-1].id)
+    if names is None:
+        runs = [r.result_summary for r in rows]
+    else:
+        runs = [{n: (bool(r[n]) if n == "detected" and r[n] is not None else r[n]) for n in names} for r in rows]
+    return trusted_response({"runs": runs, "count": len(runs), "next_cursor": next_cursor})
+
+
+@router.get("/metrics")
+async def get_rule_metrics(window_hours: Optional[float] = Query(None, gt=0), db: AsyncSession = Depends(get_async_db)):
+    """Per-rule detection/bypass metrics computed in SQL from the run summary columns.
+
+    ``window_hours`` limits the aggregate to recent runs (e.g. 24 for the last day).
+    """
+    rows = (await db.execute(rule_metrics_stmt(SimulationRun, window_hours))).all()
+    return {"rules": format_rule_metrics(rows)}
@@ -12,12 +12,15 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from database import create_tables, engine, SessionLocal
-from models import Rule
+from database import engine, SessionLocal
+from migrations import upgrade
+from models import Rule, RuleState
+from backen.utils.rule_cache import ActiveRuleCache
 
 
 def main():
-    create_tables()
+    version = upgrade(engine)
+    print(f"Schema at version {version}")
     # seed a default vulnerable loiter rule if none
     db = SessionLocal()
     try:
@@ -25,6 +28,7 @@ def main():
         if not exists:
             r = Rule(rule_id="loiter_v1", rule_json={"type": "loiter", "loiter_time_seconds": 60, "zone": "Z"}, description="Default loiter detection rule", active=True)
             db.add(r)
+            ActiveRuleCache(Rule, RuleState).bump(db)
             db.commit()
             print("Inserted default rule loiter_v1")
         else:
@@ -1,42 +1,98 @@
 """Simple Gemini client wrapper using httpx AsyncClient."""
 import os
 import json
-import asyncio
-from typing import Any, Dict
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Optional
 import httpx
 from dotenv import load_dotenv
+from backen.services.http_client import post_with_retries, stream_with_retries
+from backen.utils.resilience import CircuitOpenError
+from backen.utils.prompt_cache import PromptCache, prompt_key
+from backen.utils.single_flight import SingleFlight
+from database import AsyncSessionLocal
+from models import AIGeneratedScenario
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT", "https://api.generativeai.example/v1/generate")
 
+prompt_cache = PromptCache(AIGeneratedScenario, AsyncSessionLocal)
+# concurrent identical prompts share one upstream call
+inflight = SingleFlight()
 
-async def call_gemini(prompt: str, max_tokens: int = 512) -> Dict[str, Any]:
+
+async def call_gemini(prompt: str, max_tokens: int = 512, timeout: Optional[float] = None, use_cache: bool = True) -> Dict[str, Any]:
     """Call Gemini (placeholder). Returns parsed JSON when possible or raw text.
 
+    Uses the app's shared pooled client; ``timeout`` (seconds) overrides the
+    client's read timeout for this call. Successful responses are cached by
+    prompt hash; ``use_cache=False`` skips the lookup but refreshes the entry.
+    Concurrent calls for the same prompt share one in-flight request.
+
     TODO: Replace GEMINI_ENDPOINT and ensure GOOGLE_API_KEY is set in .env
     """
+    key = prompt_key(GEMINI_ENDPOINT, prompt, max_tokens)
+    if use_cache:
+        cached = await prompt_cache.get(key)
+        if cached is not None:
+            return cached
+    return await inflight.run(key, partial(_fetch_and_cache, key, prompt, max_tokens, timeout))
+
+
+async def _fetch_and_cache(key: str, prompt: str, max_tokens: int, timeout: Optional[float]) -> Dict[str, Any]:
+    resp = await _post_gemini(prompt, max_tokens, timeout)
+    if resp.get("success"):
+        await prompt_cache.put(key, resp)
+    return resp
+
+
+async def _post_gemini(prompt: str, max_tokens: int, timeout: Optional[float]) -> Dict[str, Any]:
     headers = {"Content-Type": "application/json"}
     if GOOGLE_API_KEY:
         headers["Authorization"] = f"Bearer {GOOGLE_API_KEY}"
 
     payload = {"prompt": prompt, "max_tokens": max_tokens}
 
-    retries = 2
-    backoff = 0.5
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for attempt in range(retries + 1):
-            try:
-                resp = await client.post(GEMINI_ENDPOINT, headers=headers, json=payload)
-                text = resp.text
-                # Try parse JSON
-                try:
-                    return {"success": True, "content": resp.json()}
-                except Exception:
-                    return {"success": True, "content": text}
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                if attempt < retries:
-                    await asyncio.sleep(backoff * (attempt + 1))
-                    continue
-                return {"success": False, "content": str(e)}
+    # limits, retries on 429/5xx and the circuit breaker live in post_with_retries
+    try:
+        resp = await post_with_retries(GEMINI_ENDPOINT, headers=headers, json=payload, timeout=timeout)
+    except CircuitOpenError as e:
+        return {"success": False, "content": str(e)}
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        return {"success": False, "content": str(e)}
+    # Try parse JSON
+    try:
+        return {"success": True, "content": resp.json()}
+    except Exception:
+        return {"success": True, "content": resp.text}
+
+
+async def stream_gemini(prompt: str, max_tokens: int = 512, timeout: Optional[float] = None, use_cache: bool = True) -> AsyncIterator[str]:
+    """Gemini output as text chunks while it arrives (see ``call_gemini`` for caching).
+
+    A cached streamed body is replayed as a single chunk; the complete streamed
+    body is cached under its own key (``stream=True``), apart from ``call_gemini``
+    responses.
+    """
+    key = prompt_key(GEMINI_ENDPOINT, prompt, max_tokens, stream=True)
+    if use_cache:
+        cached = await prompt_cache.get(key)
+        if cached is not None:
+            content = cached.get("content")
+            yield content if isinstance(content, str) else json.dumps(content)
+            return
+    headers = {"Content-Type": "application/json"}
+    if GOOGLE_API_KEY:
+        headers["Authorization"] = f"Bearer {GOOGLE_API_KEY}"
+    payload = {"prompt": prompt, "max_tokens": max_tokens, "stream": True}
+    parts = []
+    async for chunk in stream_with_retries(GEMINI_ENDPOINT, headers=headers, json=payload, timeout=timeout):
+        parts.append(chunk)
+        yield chunk
+    text = "".join(parts)
+    try:
+        content = json.loads(text)
+    except ValueError:
+        content = text
+    await prompt_cache.put(key, {"success": True, "content": content})